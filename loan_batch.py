@@ -0,0 +1,267 @@
+"""
+Batch (portfolio) amortization: reads many loans from a file and works on
+them as NumPy arrays instead of one loan at a time.
+"""
+import csv
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from loan_engine import (
+    COLUMN_DTYPES, COLUMNS, Schedule, batch_equal_principal_schedules, equal_principal_totals,
+    exact_paise_columns,
+)
+from loan_export import save_store
+from loan_timing import NULL_TIMER
+
+FIELDS = ("loan_amount", "term_months", "annual_rate")
+TOTALS_HEADER = FIELDS + ("total_principal", "total_interest", "total_payment")
+SCHEDULE_HEADER = ("Loan",) + COLUMNS
+TOTALS_FORMAT = ("%.2f", "%d", "%.10g", "%.2f", "%.2f", "%.2f")
+SCHEDULE_FORMAT = ("%d", "%d", "%.2f", "%.2f", "%.2f", "%.2f")
+
+
+def read_loans(path):
+    """
+    Reads the loan_amount, term_months and annual_rate columns of a CSV or
+    Parquet file. Returns them as three validated NumPy arrays.
+    """
+    if path.lower().endswith((".parquet", ".pq")):
+        import pandas as pd
+
+        frame = pd.read_parquet(path, columns=list(FIELDS))
+        columns = [frame[name].to_numpy(dtype=float) for name in FIELDS]
+    else:
+        with open(path, newline="") as f:
+            usecols = read_csv_header(f, path, FIELDS)
+            table = read_csv_body(f, usecols)
+        columns = list(table.reshape(-1, len(FIELDS)).T)
+
+    return validate_loans(*columns)
+
+
+def read_csv_header(f, path, names):
+    """
+    Reads the header line of the open CSV file f and returns the positions
+    of the named columns. Raises ValueError naming any that are missing.
+    """
+    header = [name.strip() for name in next(csv.reader([f.readline()]), [])]
+    missing = [name for name in names if name not in header]
+    if missing:
+        raise ValueError(f"{path}: missing column(s) {', '.join(missing)}")
+    return [header.index(name) for name in names]
+
+
+def read_csv_body(f, usecols, dtype=float):
+    """
+    Loads the usecols columns of the rest of the open CSV file f as a 2-D
+    array, one row per data line. A file with no data lines gives no rows.
+    """
+    start = f.tell()
+    while True:
+        line = f.readline()
+        if not line:
+            return np.empty((0, len(usecols)), dtype=dtype)
+        if line.strip():
+            break
+    f.seek(start)
+    return np.loadtxt(f, delimiter=",", usecols=usecols, dtype=dtype, ndmin=2)
+
+
+def validate_loans(loan_amounts, term_months, annual_rates):
+    """
+    Applies the same rules as the interactive prompts to whole columns.
+    Raises ValueError naming the first bad data row.
+    """
+    loan_amounts = np.asarray(loan_amounts, dtype=float)
+    term_months = np.asarray(term_months, dtype=float)
+    annual_rates = np.asarray(annual_rates, dtype=float)
+
+    invalid = ~(loan_amounts > 0) | ~(term_months > 0) | ~(annual_rates >= 0)
+    invalid |= term_months != np.floor(term_months)
+    invalid |= ~np.isfinite(loan_amounts) | ~np.isfinite(term_months) | ~np.isfinite(annual_rates)
+    if invalid.any():
+        row = int(np.argmax(invalid))
+        raise ValueError(
+            f"Invalid loan on data row {row + 1}: loan amount and term must be positive, "
+            "term a whole number of months, the interest rate non-negative and all finite."
+        )
+    return loan_amounts, term_months.astype(np.int64), annual_rates
+
+
+def loan_totals(loan_amounts, term_months, annual_rates, rounding=None):
+    """
+    Closed-form totals for every loan, rounded to 2 decimals. Returns a
+    2-D array with one row per loan, laid out as TOTALS_HEADER.
+
+    With a rounding policy (see loan_engine.ROUNDING_POLICIES) the totals
+    are instead the exact paise sums of each loan's exact schedule, which
+    has no closed form; pass few enough loans to build their rows at once.
+    """
+    if rounding is not None:
+        columns = exact_paise_columns(loan_amounts, term_months, annual_rates, rounding=rounding)
+        principal, interest, payment = (
+            columns[col].sum(axis=1) / 100 for col in ("Principal", "Interest", "Total")
+        )
+        return np.column_stack([loan_amounts, term_months, annual_rates, principal, interest, payment])
+
+    principal, interest, payment = equal_principal_totals(loan_amounts, term_months, annual_rates)
+    return np.column_stack([
+        loan_amounts,
+        term_months,
+        annual_rates,
+        np.round(principal, 2),
+        np.round(interest, 2),
+        np.round(payment, 2),
+    ])
+
+
+def schedule_columns(loan_amounts, term_months, annual_rates, rounding=None):
+    """
+    Full schedules for a group of loans, one loan after another, as a
+    Schedule. Padding rows are dropped, so loans stay ragged. With a
+    rounding policy the schedules are the exact paise ones.
+    """
+    if rounding is not None:
+        schedules = exact_paise_columns(loan_amounts, term_months, annual_rates, rounding=rounding)
+        schedules.update({col: schedules[col] / 100 for col in COLUMNS[1:]})
+    else:
+        schedules = batch_equal_principal_schedules(loan_amounts, term_months, annual_rates)
+    in_term = schedules["Inst.No"] > 0
+    return Schedule({
+        col: schedules[col][in_term].astype(COLUMN_DTYPES[col], copy=False) for col in COLUMNS
+    })
+
+
+def schedule_rows(loan_amounts, term_months, annual_rates, first_loan=1, rounding=None):
+    """
+    Full schedules for a group of loans as one 2-D array laid out as
+    SCHEDULE_HEADER. See schedule_columns().
+    """
+    schedule = schedule_columns(loan_amounts, term_months, annual_rates, rounding)
+    loan_numbers = np.repeat(np.arange(first_loan, first_loan + len(loan_amounts)), term_months)
+    return np.column_stack([loan_numbers] + [schedule[col] for col in COLUMNS])
+
+
+def iter_loan_schedules(loan_amounts, term_months, annual_rates, chunk_size=1000, rounding=None):
+    """
+    Lazily yields every loan's schedule, in loan order, as Schedule chunks
+    of chunk_size loans each.
+    """
+    for start in range(0, len(loan_amounts), chunk_size):
+        chunk = slice(start, start + chunk_size)
+        yield schedule_columns(loan_amounts[chunk], term_months[chunk], annual_rates[chunk], rounding)
+
+
+def write_rows(out, rows, fmt):
+    """
+    Appends a 2-D array from loan_totals() or schedule_rows() to out as CSV.
+    """
+    np.savetxt(out, rows, fmt=list(fmt), delimiter=",")
+
+
+def write_loans(out, loan_amounts, term_months, annual_rates, schedules=False,
+                chunk_size=1000, first_loan=1, timer=NULL_TIMER, rounding=None):
+    """
+    Writes the CSV body (no header) for a group of loans to the open file
+    out. Full schedules (and exact totals, which need them) are built
+    chunk_size loans at a time to bound memory.
+    """
+    if not schedules and rounding is None:
+        with timer.span("compute"):
+            rows = loan_totals(loan_amounts, term_months, annual_rates)
+        with timer.span("write"):
+            write_rows(out, rows, TOTALS_FORMAT)
+        return
+
+    for start in range(0, len(loan_amounts), chunk_size):
+        chunk = slice(start, start + chunk_size)
+        with timer.span("compute"):
+            if schedules:
+                rows = schedule_rows(
+                    loan_amounts[chunk], term_months[chunk], annual_rates[chunk],
+                    first_loan=first_loan + start, rounding=rounding,
+                )
+            else:
+                rows = loan_totals(
+                    loan_amounts[chunk], term_months[chunk], annual_rates[chunk], rounding
+                )
+        with timer.span("write"):
+            write_rows(out, rows, SCHEDULE_FORMAT if schedules else TOTALS_FORMAT)
+
+
+def _write_shard(path, loan_amounts, term_months, annual_rates, schedules, chunk_size, first_loan,
+                 rounding):
+    """
+    Process-pool task: writes one shard to its own temp file so the parent
+    never has to unpickle the results.
+    """
+    with open(path, "w", newline="") as out:
+        write_loans(out, loan_amounts, term_months, annual_rates, schedules, chunk_size, first_loan,
+                    rounding=rounding)
+    return path
+
+
+def run_batch(input_path, out, schedules=False, chunk_size=1000, workers=1, timer=NULL_TIMER,
+              rounding=None):
+    """
+    Amortizes every loan in input_path and writes CSV to the open file out.
+
+    With workers > 1 the loans are split into contiguous shards and handed
+    to a process pool. Each shard is written to a temp file, and the files
+    are copied to out in input order, so the output matches a single-process
+    run byte for byte. Stages are timed into timer; with a pool, only the
+    parent's wait for and merge of the shards shows up. A rounding policy
+    switches to exact paise arithmetic (see loan_engine.exact_paise_columns).
+    """
+    with timer.span("read"):
+        loan_amounts, term_months, annual_rates = read_loans(input_path)
+    out.write(",".join(SCHEDULE_HEADER if schedules else TOTALS_HEADER) + "\n")
+
+    if workers <= 1 or len(loan_amounts) <= chunk_size:
+        write_loans(out, loan_amounts, term_months, annual_rates, schedules, chunk_size,
+                    timer=timer, rounding=rounding)
+        return
+
+    # A few shards per worker keeps the pool busy when loan terms vary a lot.
+    bounds = np.linspace(0, len(loan_amounts), workers * 4 + 1).astype(np.int64)
+    shards = [(start, stop) for start, stop in zip(bounds[:-1], bounds[1:]) if stop > start]
+
+    with tempfile.TemporaryDirectory(prefix="loan_batch_") as tmpdir, \
+            ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(
+                _write_shard,
+                os.path.join(tmpdir, f"shard{number:05d}.csv"),
+                loan_amounts[start:stop],
+                term_months[start:stop],
+                annual_rates[start:stop],
+                schedules,
+                chunk_size,
+                int(start) + 1,
+                rounding,
+            )
+            for number, (start, stop) in enumerate(shards)
+        ]
+        # Merge as shards finish, but strictly in input order.
+        for future in futures:
+            with timer.span("shards"):
+                path = future.result()
+            with timer.span("merge"), open(path, newline="") as shard:
+                shutil.copyfileobj(shard, out)
+
+
+def store_batch(input_path, store_path, chunk_size=1000, timer=NULL_TIMER, rounding=None):
+    """
+    Amortizes every loan in input_path into a binary schedule store (see
+    loan_store.py) at store_path, chunk_size loans at a time. Returns the
+    portfolio's (principal, interest, payment) totals.
+    """
+    with timer.span("read"):
+        loans = read_loans(input_path)
+    with timer.span("store"):
+        chunks = iter_loan_schedules(*loans, chunk_size, rounding)
+        return save_store(store_path, chunks, *loans, rounding)
@@ -0,0 +1,186 @@
+"""
+Bounded LRU cache of computed schedules, with an optional sqlite file as a
+persistent second tier so a restarted process can skip recomputation.
+
+Both tiers are bounded: memory by entry count and bytes, the sqlite file by
+entry count (the schedules written longest ago are dropped first).
+"""
+import functools
+import sqlite3
+from collections import OrderedDict
+
+import numpy as np
+
+from loan_engine import (
+    COLUMN_DTYPES, COLUMNS, ROUNDING_POLICIES, Schedule, equal_principal_schedule,
+    exact_equal_principal_schedule,
+)
+from loan_segments import ANNUITY, EQUAL_PRINCIPAL, annuity_schedule
+
+
+def exact_method(rounding):
+    """Method name for exact (integer paise) schedules under a rounding policy."""
+    return f"{EQUAL_PRINCIPAL}_exact_{rounding}"
+
+
+# How each method's schedule is computed on a cache miss
+METHODS = {
+    EQUAL_PRINCIPAL: equal_principal_schedule,
+    ANNUITY: annuity_schedule,
+}
+for _rounding in ROUNDING_POLICIES:
+    METHODS[exact_method(_rounding)] = functools.partial(
+        exact_equal_principal_schedule, rounding=_rounding
+    )
+
+
+def cache_inputs(loan_amount, term_months, annual_rate):
+    """
+    The inputs as a cache key sees them: amounts to the paisa, rates to 1e-6
+    percent. Schedules to be cached should be computed from these, so a key
+    always stands for the same schedule.
+    """
+    return round(float(loan_amount), 2), int(term_months), round(float(annual_rate), 6)
+
+
+def cache_key(loan_amount, term_months, annual_rate, method=EQUAL_PRINCIPAL):
+    """
+    Normalizes the inputs (see cache_inputs()) so that e.g. 500000 and
+    500000.001 share a key.
+    """
+    return f"{method}:{loan_amount:.2f}:{int(term_months)}:{annual_rate:.6f}"
+
+
+class ScheduleCache:
+    """
+    LRU cache of Schedule objects bounded by entry count and by bytes. The
+    sqlite tier at path, if any, keeps at most max_disk_entries schedules.
+
+    Cached schedules are shared between callers, so their arrays are made
+    read-only. hits, misses, disk_hits and evictions count cache traffic;
+    stats() reports them together with the current size.
+    """
+
+    def __init__(self, max_entries=128, max_bytes=64 * 1024 * 1024, path=None,
+                 max_disk_entries=10_000):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_disk_entries = max_disk_entries
+        self.entries = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self.evictions = 0
+
+        self.db = None
+        if path is not None:
+            self.db = sqlite3.connect(path)
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS schedules (key TEXT PRIMARY KEY, rows INTEGER, data BLOB)"
+            )
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, loan_amount, term_months, annual_rate, method=EQUAL_PRINCIPAL):
+        """Cached schedule for these inputs, or None."""
+        key = cache_key(loan_amount, term_months, annual_rate, method)
+        schedule = self.entries.get(key)
+        if schedule is not None:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return schedule
+
+        schedule = self._load(key)
+        if schedule is not None:
+            self.disk_hits += 1
+            self._remember(key, schedule)
+            return schedule
+
+        self.misses += 1
+        return None
+
+    def put(self, loan_amount, term_months, annual_rate, schedule, method=EQUAL_PRINCIPAL):
+        """Stores a schedule in memory and, if configured, on disk."""
+        key = cache_key(loan_amount, term_months, annual_rate, method)
+        for column in schedule.columns.values():
+            column.flags.writeable = False
+        self._remember(key, schedule)
+        self._store(key, schedule)
+
+    def schedule(self, loan_amount, term_months, annual_rate, method=EQUAL_PRINCIPAL):
+        """
+        Returns the cached schedule, computing and caching it on a miss. The
+        schedule is that of the normalized inputs (see cache_inputs()).
+        """
+        inputs = cache_inputs(loan_amount, term_months, annual_rate)
+        schedule = self.get(*inputs, method)
+        if schedule is None:
+            schedule = METHODS[method](*inputs)
+            self.put(*inputs, schedule, method)
+        return schedule
+
+    def clear(self):
+        """Drops the in-memory tier; the disk tier is kept."""
+        self.entries.clear()
+        self.nbytes = 0
+
+    def close(self):
+        if self.db is not None:
+            self.db.close()
+            self.db = None
+
+    def stats(self):
+        return {
+            "entries": len(self.entries),
+            "bytes": self.nbytes,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+    def _remember(self, key, schedule):
+        if key in self.entries:
+            self.nbytes -= self.entries.pop(key).nbytes
+        if schedule.nbytes > self.max_bytes:
+            return  # would evict everything else; leave it to the disk tier
+        self.entries[key] = schedule
+        self.nbytes += schedule.nbytes
+        while len(self.entries) > self.max_entries or self.nbytes > self.max_bytes:
+            _, evicted = self.entries.popitem(last=False)
+            self.nbytes -= evicted.nbytes
+            self.evictions += 1
+
+    def _store(self, key, schedule):
+        # Columns are stored back to back as raw bytes in COLUMNS order
+        if self.db is None:
+            return
+        data = b"".join(schedule[col].tobytes() for col in COLUMNS)
+        with self.db:
+            self.db.execute(
+                "INSERT OR REPLACE INTO schedules (key, rows, data) VALUES (?, ?, ?)",
+                (key, len(schedule), data),
+            )
+            # A replaced row gets a new rowid, so the lowest rowids were written longest ago
+            self.db.execute(
+                "DELETE FROM schedules WHERE rowid <= "
+                "(SELECT rowid FROM schedules ORDER BY rowid DESC LIMIT 1 OFFSET ?)",
+                (self.max_disk_entries,),
+            )
+
+    def _load(self, key):
+        if self.db is None:
+            return None
+        row = self.db.execute("SELECT rows, data FROM schedules WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        rows, data = row
+        columns = {}
+        offset = 0
+        for col in COLUMNS:
+            dtype = COLUMN_DTYPES[col]
+            columns[col] = np.frombuffer(data, dtype=dtype, count=rows, offset=offset)
+            offset += rows * dtype.itemsize
+        return Schedule(columns)
@@ -0,0 +1,555 @@
+"""
+Benchmarks for the schedule math, INR formatting, table fill, chart redraw
+and exports. Every case also checks its numbers against a plain-Python
+reference schedule, so a fast but wrong change fails too.
+
+Usage:
+    python loan_calc_bench.py --save bench_baseline.json     # record a baseline
+    python loan_calc_bench.py --baseline bench_baseline.json # compare against it
+
+A case regresses when it is more than --threshold (default 25%) slower than
+its baseline. The exit status is 1 if any case regresses or fails its check.
+The table-fill case needs a display; run under Xvfb (xvfb-run) on headless
+machines, otherwise it is skipped.
+"""
+import argparse
+import csv
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from decimal import ROUND_HALF_UP, Decimal
+
+import numpy as np
+
+from loan_batch import iter_loan_schedules
+from loan_cashflow import monthly_cash_flows
+from loan_engine import (
+    COLUMNS, batch_equal_principal_schedules, equal_principal_schedule, equal_principal_totals,
+    exact_equal_principal_schedule, paise_sum,
+)
+from loan_export import save_csv, save_store, save_xlsx
+from loan_format import format_inr, format_inr_column
+from loan_segments import (
+    ANNUITY, EQUAL_PRINCIPAL, REDUCE_TERM, Moratorium, Prepayment, RateReset, SegmentedLoan,
+)
+from loan_store import ScheduleStore
+
+# `import loan_calc_gui` must stay under this many seconds (see README)
+STARTUP_BUDGET_S = 0.3
+
+# Rounded cells may differ from the reference by one paisa on half-paisa ties
+TOLERANCE = 0.0101
+
+BENCHMARKS = []
+
+
+class Skipped(Exception):
+    """Raised by a benchmark that cannot run here (e.g. no display)."""
+
+
+def benchmark(name):
+    """Registers a function returning (seconds, checked_ok) under name."""
+    def register(func):
+        BENCHMARKS.append((name, func))
+        return func
+    return register
+
+
+def best_of(repeat, func, *args):
+    """Best wall-clock time of repeat calls, and the last call's result."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def reference_schedule(loan_amount, term_months, annual_rate):
+    """
+    The original per-row loop from calculate_loan(), kept as the yardstick
+    for every case. Returns a dict of column lists.
+    """
+    principal_per_installment = loan_amount / term_months
+    balance = loan_amount
+    monthly_rate = annual_rate / 100 / 12
+    columns = {col: [] for col in COLUMNS}
+    for i in range(1, term_months + 1):
+        interest = balance * monthly_rate
+        total = principal_per_installment + interest
+        balance -= principal_per_installment
+        if balance < 0:
+            balance = 0.0
+        columns["Inst.No"].append(i)
+        columns["Principal"].append(round(principal_per_installment, 2))
+        columns["Interest"].append(round(interest, 2))
+        columns["Total"].append(round(total, 2))
+        columns["Balance"].append(round(balance, 2))
+    return columns
+
+
+def matches_reference(schedule, loan_amount, term_months, annual_rate):
+    reference = reference_schedule(loan_amount, term_months, annual_rate)
+    return all(
+        len(schedule[col]) == term_months
+        and np.abs(np.asarray(schedule[col], dtype=float) - reference[col]).max() <= TOLERANCE
+        for col in COLUMNS
+    )
+
+
+def schedule_case(term_months, repeat):
+    loan_amount, annual_rate = 5_000_000.0, 9.5
+    seconds, schedule = best_of(
+        repeat, equal_principal_schedule, loan_amount, term_months, annual_rate
+    )
+    return seconds, matches_reference(schedule, loan_amount, term_months, annual_rate)
+
+
+@benchmark("schedule_60")
+def bench_schedule_60():
+    return schedule_case(60, 200)
+
+
+@benchmark("schedule_360")
+def bench_schedule_360():
+    return schedule_case(360, 200)
+
+
+@benchmark("schedule_100k")
+def bench_schedule_100k():
+    return schedule_case(100_000, 5)
+
+
+@benchmark("batch_totals_1m")
+def bench_batch_totals():
+    rng = np.random.default_rng(0)
+    amounts = rng.uniform(1e4, 1e7, 1_000_000).round(2)
+    terms = rng.integers(6, 361, 1_000_000)
+    rates = rng.uniform(0, 20, 1_000_000).round(2)
+    seconds, (_, interest, _) = best_of(3, equal_principal_totals, amounts, terms, rates)
+    # Closed-form interest is unrounded; the row sums may drift by a paisa per row
+    ok = all(
+        abs(sum(reference_schedule(amounts[i], int(terms[i]), rates[i])["Interest"]) - interest[i])
+        <= terms[i] * 0.005
+        for i in range(0, 1_000_000, 100_000)
+    )
+    return seconds, ok
+
+
+@benchmark("cashflow_1m")
+def bench_cashflow():
+    rng = np.random.default_rng(0)
+    amounts = rng.uniform(1e4, 1e7, 1_000_000).round(2)
+    terms = rng.integers(6, 361, 1_000_000)
+    rates = rng.uniform(0, 20, 1_000_000).round(2)
+    starts = rng.integers(600, 720, 1_000_000)
+    seconds, (_, flows) = best_of(3, monthly_cash_flows, amounts, terms, rates, starts)
+    # The book must repay exactly what it lent, with the closed-form interest;
+    # each month is rounded once, so allow half a paisa per month
+    _, interest, _ = equal_principal_totals(amounts, terms, rates)
+    allowance = len(flows["Total"]) * 0.005
+    ok = (
+        abs(flows["Principal"].sum() - amounts.sum()) <= allowance
+        and abs(flows["Interest"].sum() - interest.sum()) <= allowance
+        and flows["Balance"][-1] == 0
+        and flows["Installments"].sum() == terms.sum()
+    )
+    return seconds, bool(ok)
+
+
+@benchmark("batch_schedules_2k")
+def bench_batch_schedules():
+    rng = np.random.default_rng(1)
+    amounts = rng.uniform(1e4, 1e7, 2000).round(2)
+    terms = rng.integers(6, 361, 2000)
+    rates = rng.uniform(0, 20, 2000).round(2)
+    seconds, schedules = best_of(3, batch_equal_principal_schedules, amounts, terms, rates)
+    ok = all(
+        matches_reference(
+            {col: schedules[col][i, :terms[i]] for col in COLUMNS},
+            amounts[i], int(terms[i]), rates[i],
+        )
+        for i in range(0, 2000, 400)
+    )
+    return seconds, ok
+
+
+@benchmark("exact_schedule_100k")
+def bench_exact_schedule():
+    loan_amount, term_months, annual_rate = 5_000_000.0, 100_000, 9.5
+    seconds, schedule = best_of(5, exact_equal_principal_schedule, loan_amount, term_months, annual_rate)
+
+    # Yardstick: the same schedule with one Decimal per cell, for 1,000 rows
+    loan_paise = int(Decimal("5000000.00") * 100)
+    principal = loan_paise // term_months
+    monthly_rate = Decimal("9.5") / 1200
+    interest = [
+        int(((loan_paise - k * principal) * monthly_rate).to_integral_value(ROUND_HALF_UP))
+        for k in range(1000)
+    ]
+    ok = (
+        paise_sum(schedule["Principal"]) == loan_paise
+        and paise_sum(schedule["Total"]) == paise_sum(schedule["Principal"]) + paise_sum(schedule["Interest"])
+        and schedule["Balance"][-1] == 0
+        and (schedule["Interest"][:1000] * 100).round().astype(int).tolist() == interest
+    )
+    return seconds, ok
+
+
+def reference_segmented_schedule(loan_amount, term_months, annual_rate, method, events):
+    """
+    A SegmentedLoan worked out one month at a time, with every event applied
+    after its installment. Returns a dict of unrounded column lists, with
+    prepayments added into the row they are paid with.
+    """
+    def installment(balance, monthly_rate, months):
+        if method == EQUAL_PRINCIPAL or monthly_rate == 0:
+            return balance / months
+        return balance * monthly_rate / (1 - (1 + monthly_rate) ** -months)
+
+    def months_left(balance, monthly_rate, amount):
+        months = 0
+        while balance > 1e-6:
+            balance = balance * (1 + monthly_rate) - amount if method == ANNUITY else balance - amount
+            months += 1
+        return months
+
+    balance = loan_amount
+    monthly_rate = annual_rate / 100 / 12
+    remaining = term_months
+    amount = installment(balance, monthly_rate, remaining)
+    month = moratorium_end = 0
+    interest_only = False
+    pending = sorted(events, key=lambda event: event.month)
+    columns = {col: [] for col in COLUMNS}
+    while True:
+        while pending and pending[0].month <= month:
+            event = pending.pop(0)
+            in_moratorium = month < moratorium_end
+            if isinstance(event, RateReset):
+                monthly_rate = event.annual_rate / 100 / 12
+                if not in_moratorium and remaining > 0:
+                    amount = installment(balance, monthly_rate, remaining)
+            elif isinstance(event, Prepayment):
+                paid = min(event.amount, balance)
+                balance -= paid
+                columns["Principal"][-1] += paid
+                columns["Total"][-1] += paid
+                columns["Balance"][-1] = balance
+                if balance <= 0 or in_moratorium or remaining <= 0:
+                    continue
+                if event.reduce == REDUCE_TERM:
+                    remaining = months_left(balance, monthly_rate, amount)
+                else:
+                    amount = installment(balance, monthly_rate, remaining)
+            else:
+                moratorium_end = max(moratorium_end, month + event.months)
+                interest_only = event.interest_only
+        if balance <= 1e-6 or (remaining <= 0 and month >= moratorium_end):
+            return columns
+
+        interest = balance * monthly_rate
+        if month < moratorium_end:
+            principal = 0.0 if interest_only else -interest
+        else:
+            remaining -= 1
+            principal = balance if remaining == 0 else min(
+                amount - interest if method == ANNUITY else amount, balance
+            )
+        balance -= principal
+        month += 1
+        if month == moratorium_end and remaining > 0:
+            amount = installment(balance, monthly_rate, remaining)
+        columns["Inst.No"].append(month)
+        columns["Principal"].append(principal)
+        columns["Interest"].append(interest)
+        columns["Total"].append(principal + interest)
+        columns["Balance"].append(max(balance, 0.0))
+
+
+@benchmark("segments_events")
+def bench_segments():
+    # An EMI loan with a reset, both kinds of prepayment and a moratorium of
+    # each kind, and an equal principal loan with the same events
+    events = [
+        RateReset(12, 9.0),
+        Prepayment(24, 500_000),
+        Moratorium(36, 6),
+        Prepayment(60, 250_000, reduce=REDUCE_TERM),
+        RateReset(90, 7.25),
+        Moratorium(120, 3, interest_only=True),
+    ]
+    loans = [(5_000_000.0, 240, 8.5, method, events) for method in (ANNUITY, EQUAL_PRINCIPAL)]
+
+    def quote():
+        results = []
+        for loan in loans:
+            segmented = SegmentedLoan(*loan)
+            results.append((segmented, segmented.totals(),
+                            [segmented.balance_at(m) for m in range(len(segmented) + 2)]))
+        return results
+
+    seconds, results = best_of(200, quote)
+    ok = True
+    for loan, (segmented, totals, balances) in zip(loans, results):
+        reference = reference_segmented_schedule(*loan)
+        schedule = segmented.schedule()
+        months = len(reference["Inst.No"])
+        ok &= bool(
+            len(schedule) == months
+            and all(np.abs(np.asarray(schedule[col], dtype=float) - np.round(reference[col], 2)).max()
+                    <= TOLERANCE for col in COLUMNS)
+            # Totals and balances are unrounded, so they must agree much closer
+            and abs(totals[0] - sum(reference["Principal"])) <= 1e-4
+            and abs(totals[1] - sum(reference["Interest"])) <= 1e-4
+            and abs(balances[0] - loan[0]) <= 1e-4
+            and max(abs(balance - expected) for balance, expected
+                    in zip(balances[1:], reference["Balance"] + [0.0])) <= 1e-4
+        )
+    return seconds, ok
+
+
+@benchmark("format_inr_100k")
+def bench_format_inr():
+    values = equal_principal_schedule(50_000_000.0, 100_000, 9.5)["Interest"]
+    seconds, formatted = best_of(3, lambda: [format_inr(value) for value in values.tolist()])
+    return seconds, formatted[:100] == format_inr_column(values[:100])
+
+
+@benchmark("format_inr_column_100k")
+def bench_format_inr_column():
+    values = equal_principal_schedule(50_000_000.0, 100_000, 9.5)["Interest"]
+    seconds, formatted = best_of(3, format_inr_column, values)
+    return seconds, formatted[::997] == [format_inr(value) for value in values[::997].tolist()]
+
+
+@benchmark("table_fill_10k")
+def bench_table_fill():
+    import tkinter as tk
+
+    try:
+        root = tk.Tk()
+    except tk.TclError as exc:
+        raise Skipped(f"no display ({exc})")
+    try:
+        from loan_calc_gui import LoanCalculatorApp
+
+        app = LoanCalculatorApp(root)
+        app.data = equal_principal_schedule(5_000_000.0, 10_000, 9.5)
+        app.show_totals()
+        root.update()
+
+        def fill():
+            app.table.set_rows(len(app.data) + 1, app.row_values)
+            app.table.yview("moveto", "0.5")
+            root.update()
+
+        seconds, _ = best_of(5, fill)
+        first = app.table.first
+        shown = app.tree.item(app.tree.get_children()[0], "values")
+        reference = reference_schedule(5_000_000.0, 10_000, 9.5)
+        expected = (str(first + 1),) + tuple(
+            format_inr(reference[col][first]) for col in COLUMNS[1:]
+        )
+        return seconds, tuple(str(value) for value in shown) == expected
+    finally:
+        root.destroy()
+
+
+def chart_case(term_months):
+    import matplotlib
+    matplotlib.use("Agg")
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    from loan_calc_gui import MIN_CHART_BUCKETS, minmax_downsample
+
+    schedule = equal_principal_schedule(5_000_000.0, term_months, 9.5)
+    fig = Figure(figsize=(7, 3))
+    canvas = FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    principal_line, = ax.plot([], [])
+    interest_line, = ax.plot([], [])
+
+    def redraw():
+        x = schedule["Inst.No"]
+        principal_line.set_data(*minmax_downsample(x, schedule["Principal"], MIN_CHART_BUCKETS))
+        interest_line.set_data(*minmax_downsample(x, schedule["Interest"], MIN_CHART_BUCKETS))
+        ax.relim()
+        ax.autoscale_view()
+        canvas.draw()
+
+    seconds, _ = best_of(5, redraw)
+    reference = reference_schedule(5_000_000.0, term_months, 9.5)
+    ok = (
+        len(interest_line.get_xdata()) <= 2 * MIN_CHART_BUCKETS
+        and interest_line.get_ydata().max() == max(reference["Interest"])
+        and interest_line.get_ydata().min() == min(reference["Interest"])
+    )
+    return seconds, ok
+
+
+@benchmark("chart_redraw_60")
+def bench_chart_60():
+    return chart_case(60)
+
+
+@benchmark("chart_redraw_100k")
+def bench_chart_100k():
+    return chart_case(100_000)
+
+
+def export_case(save, suffix, term_months, read_back):
+    schedule = equal_principal_schedule(5_000_000.0, term_months, 9.5)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "schedule" + suffix)
+        seconds, _ = best_of(3, lambda: save(path, schedule.chunks(4096)))
+        rows = read_back(path)
+    return seconds, matches_reference(
+        {col: [row[index] for row in rows] for index, col in enumerate(COLUMNS)},
+        5_000_000.0, term_months, 9.5,
+    )
+
+
+def read_csv_rows(path):
+    with open(path, newline="") as f:
+        return [[float(value) for value in row] for row in list(csv.reader(f))[1:] if row[0] != "Total"]
+
+
+def read_xlsx_rows(path):
+    from openpyxl import load_workbook
+
+    sheet = load_workbook(path, read_only=True)["Schedule"]
+    return [row for row in sheet.iter_rows(min_row=2, values_only=True) if row[0] != "Total"]
+
+
+@benchmark("export_csv_100k")
+def bench_export_csv():
+    return export_case(save_csv, ".csv", 100_000, read_csv_rows)
+
+
+@benchmark("export_xlsx_20k")
+def bench_export_xlsx():
+    return export_case(save_xlsx, ".xlsx", 20_000, read_xlsx_rows)
+
+
+def read_store_rows(path):
+    with ScheduleStore(path) as store:
+        return list(store.schedule(0).rows())
+
+
+@benchmark("export_store_100k")
+def bench_export_store():
+    def save(path, chunks):
+        return save_store(path, chunks, 5_000_000.0, 100_000, 9.5)
+    return export_case(save, ".lstore", 100_000, read_store_rows)
+
+
+@benchmark("store_fetch_1k_of_20k")
+def bench_store_fetch():
+    # Random loans out of a 20k-loan store, as a reconciliation job reads them
+    rng = np.random.default_rng(0)
+    loan_amounts = rng.uniform(1e5, 1e7, 20_000).round(2)
+    term_months = rng.integers(1, 361, 20_000)
+    annual_rates = rng.uniform(0, 20, 20_000).round(3)
+    picks = rng.integers(0, 20_000, 1_000)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "loans.lstore")
+        save_store(path, iter_loan_schedules(loan_amounts, term_months, annual_rates),
+                   loan_amounts, term_months, annual_rates)
+
+        def fetch():
+            with ScheduleStore(path) as store:
+                return [np.array(store.schedule(int(j))["Interest"]) for j in picks]
+
+        seconds, fetched = best_of(5, fetch)
+    ok = True
+    for j, interest in zip(picks[:20], fetched[:20]):
+        reference = reference_schedule(loan_amounts[j], int(term_months[j]), annual_rates[j])
+        ok &= bool(len(interest) == term_months[j]
+                   and np.abs(interest - reference["Interest"]).max() <= TOLERANCE)
+    return seconds, ok
+
+
+@benchmark("gui_import")
+def bench_gui_import():
+    # Fresh interpreter each time; -X importtime reports cumulative microseconds
+    def import_gui():
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", "import loan_calc_gui"],
+            capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        )
+        last = result.stderr.strip().splitlines()[-1]
+        return int(last.split("|")[1]) / 1e6
+
+    imports = [import_gui() for _ in range(3)]
+    seconds = min(imports)
+    return seconds, seconds <= STARTUP_BUDGET_S
+
+
+def run(selected):
+    """Runs the selected benchmarks, printing one line each. Returns results."""
+    results = {}
+    for name, func in BENCHMARKS:
+        if selected and not any(pattern in name for pattern in selected):
+            continue
+        try:
+            seconds, ok = func()
+        except Skipped as exc:
+            print(f"{name:<26} skipped: {exc}")
+            continue
+        results[name] = {"seconds": seconds, "ok": bool(ok)}
+        print(f"{name:<26} {seconds * 1000:>10.3f} ms  {'ok' if ok else 'MISMATCH'}")
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Prints regressions against baseline; returns True if there were none."""
+    clean = True
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        ratio = result["seconds"] / baseline[name]["seconds"]
+        if ratio > 1 + threshold:
+            clean = False
+            print(f"REGRESSION {name}: {ratio:.2f}x the baseline")
+    return clean
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Loan calculator benchmarks.")
+    parser.add_argument("-k", action="append", default=[], metavar="NAME",
+                        help="Only run benchmarks whose name contains NAME (repeatable).")
+    parser.add_argument("--save", metavar="FILE", help="Write the results to FILE as JSON.")
+    parser.add_argument("--baseline", metavar="FILE", help="Compare against a saved JSON baseline.")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="Allowed slowdown against the baseline (default: 0.25).")
+    args = parser.parse_args(argv)
+
+    results = run(args.k)
+    ok = all(result["ok"] for result in results.values())
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        ok = compare(results, baseline, args.threshold) and ok
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({
+                "python": platform.python_version(),
+                "numpy": np.__version__,
+                "machine": platform.machine(),
+                "results": results,
+            }, f, indent=2)
+
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
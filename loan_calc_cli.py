@@ -1,86 +1,342 @@
-def format_inr(amount):
-    """
-    Formats a number with commas in Indian style (e.g., 1,23,456.78).
-    """
-    s = f"{amount:,.2f}"
-    parts = s.split(".")
-    integer_part = parts[0].replace(",", "")
-
-    if len(integer_part) > 3:
-        last_three = integer_part[-3:]
-        rest = integer_part[:-3]
-        rest_with_commas = ""
-        while len(rest) > 2:
-            rest_with_commas = "," + rest[-2:] + rest_with_commas
-            rest = rest[:-2]
-        integer_part = rest + rest_with_commas + "," + last_three
-    return integer_part + "." + parts[1]
-
-def calculate_loan():
+import argparse
+import os
+import sys
+
+import numpy as np
+
+from loan_batch import TOTALS_FORMAT, run_batch, store_batch
+from loan_cashflow import monthly_cash_flows, read_portfolio, write_cash_flows
+from loan_cache import EQUAL_PRINCIPAL, ScheduleCache, exact_method
+from loan_engine import (
+    ROUND_HALF_UP, ROUNDING_POLICIES, equal_principal_schedule, exact_equal_principal_schedule,
+    iter_exact_schedule_chunks, iter_schedule_chunks, schedule_totals,
+)
+from loan_export import write_csv, write_ndjson
+from loan_format import format_inr, format_inr_column
+from loan_grid import parse_range, validate_axes, write_grid
+from loan_store import ScheduleStore
+from loan_timing import NULL_TIMER, StageTimer
+
+
+def calculate_loan(cache=None, timer=NULL_TIMER, rounding=None):
     """
     Calculates loan amortization and prints the schedule.
+    A loan_cache.ScheduleCache, if given, is consulted before computing.
+    Each stage is timed into timer (a loan_timing.StageTimer). A rounding
+    policy switches to the exact integer paise schedule.
     """
-    while True:
-        try:
-            loan_amount_str = input("Enter Loan Amount: ")
-            loan_amount = float(loan_amount_str.replace(',', ''))
-            if loan_amount <= 0:
-                raise ValueError
-            break
-        except ValueError:
-            print("Invalid loan amount. Please enter a positive number.")
-
-    while True:
-        try:
-            term_months = int(input("Enter Term (months): "))
-            if term_months <= 0:
-                raise ValueError
-            break
-        except ValueError:
-            print("Invalid term. Please enter a positive integer.")
-
-    while True:
-        try:
-            annual_rate = float(input("Enter Annual Interest Rate (%): "))
-            if annual_rate < 0:
-                raise ValueError
-            break
-        except ValueError:
-            print("Invalid interest rate. Please enter a non-negative number.")
-
-    principal_per_installment = loan_amount / term_months
-    balance = loan_amount
-    monthly_rate = annual_rate / 100 / 12
-
-    print("\n--- Loan Amortization Schedule ---")
-    print(f"{'Inst.No':<10}{'Principal':>15}{'Interest':>15}{'Total':>15}{'Balance':>15}")
-    print("-" * 70)
+    with timer.span("input"):
+        while True:
+            try:
+                loan_amount_str = input("Enter Loan Amount: ")
+                loan_amount = float(loan_amount_str.replace(',', ''))
+                if loan_amount <= 0 or not np.isfinite(loan_amount):
+                    raise ValueError
+                break
+            except ValueError:
+                print("Invalid loan amount. Please enter a positive number.")
+
+        while True:
+            try:
+                term_months = int(input("Enter Term (months): "))
+                if term_months <= 0:
+                    raise ValueError
+                break
+            except ValueError:
+                print("Invalid term. Please enter a positive integer.")
 
-    total_principal_paid = 0
-    total_interest_paid = 0
-    total_payment_made = 0
+        while True:
+            try:
+                annual_rate = float(input("Enter Annual Interest Rate (%): "))
+                if annual_rate < 0 or not np.isfinite(annual_rate):
+                    raise ValueError
+                break
+            except ValueError:
+                print("Invalid interest rate. Please enter a non-negative number.")
 
-    for i in range(1, term_months + 1):
-        interest = balance * monthly_rate
-        total = principal_per_installment + interest
-        balance -= principal_per_installment
-        if balance < 0:
-            balance = 0.0
+    with timer.span("schedule"):
+        if cache is not None:
+            method = EQUAL_PRINCIPAL if rounding is None else exact_method(rounding)
+            schedule = cache.schedule(loan_amount, term_months, annual_rate, method)
+        elif rounding is not None:
+            schedule = exact_equal_principal_schedule(loan_amount, term_months, annual_rate, rounding)
+        else:
+            schedule = equal_principal_schedule(loan_amount, term_months, annual_rate)
 
-        principal_rounded = round(principal_per_installment, 2)
-        interest_rounded = round(interest, 2)
-        total_rounded = round(total, 2)
-        balance_rounded = round(balance, 2)
+    # Format whole columns at once rather than four calls per row
+    with timer.span("format"):
+        formatted = [format_inr_column(schedule[col]) for col in ("Principal", "Interest", "Total", "Balance")]
 
-        print(f"{i:<10}{format_inr(principal_rounded):>15}{format_inr(interest_rounded):>15}{format_inr(total_rounded):>15}{format_inr(balance_rounded):>15}")
+    with timer.span("print"):
+        print("\n--- Loan Amortization Schedule ---")
+        print(f"{'Inst.No':<10}{'Principal':>15}{'Interest':>15}{'Total':>15}{'Balance':>15}")
+        print("-" * 70)
+        for i, principal, interest, total, balance in zip(schedule["Inst.No"].tolist(), *formatted):
+            print(f"{i:<10}{principal:>15}{interest:>15}{total:>15}{balance:>15}")
 
-        total_principal_paid += principal_rounded
-        total_interest_paid += interest_rounded
-        total_payment_made += total_rounded
+    with timer.span("totals"):
+        total_principal_paid, total_interest_paid, total_payment_made = schedule_totals(schedule)
 
     print("-" * 70)
     print(f"{'Total':<10}{format_inr(total_principal_paid):>15}{format_inr(total_interest_paid):>15}{format_inr(total_payment_made):>15}{'':>15}")
     print("---------------------------------\n")
 
+def parse_amount(text):
+    """
+    Parses a loan amount the way the prompt does, allowing thousands commas.
+    """
+    return float(text.replace(',', ''))
+
+def parse_installments(text):
+    """
+    Parses FIRST:LAST (1-based, inclusive) or a single installment number
+    into a (start, stop) slice.
+    """
+    first, _, last = text.partition(":")
+    try:
+        first = int(first)
+        last = int(last) if last else first
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid installment range {text!r}")
+    if not 1 <= first <= last:
+        raise argparse.ArgumentTypeError(f"invalid installment range {text!r}")
+    return first - 1, last
+
+def main(argv=None):
+    """
+    Runs the interactive calculator, or the batch/stream subcommand when given.
+    """
+    parser = argparse.ArgumentParser(description="Loan amortization calculator.")
+    parser.add_argument("--cache", metavar="FILE",
+                        help="Keep computed schedules in this sqlite file and reuse them.")
+    parser.add_argument("--exact", action="store_true",
+                        help="Compute in integer paise so that every total reconciles exactly.")
+    parser.add_argument("--rounding", choices=ROUNDING_POLICIES, default=ROUND_HALF_UP,
+                        help="How --exact rounds interest to the paisa (default: half_up).")
+    parser.add_argument("--profile", action="store_true",
+                        help="Print how long each stage took to stderr.")
+    parser.add_argument("--profile-stats", metavar="FILE",
+                        help="Also run under cProfile and dump pstats data to FILE (implies --profile).")
+    subcommands = parser.add_subparsers(dest="command")
+
+    batch = subcommands.add_parser("batch", help="Amortize every loan in a CSV or Parquet file.")
+    batch.add_argument("input", help="File with loan_amount, term_months and annual_rate columns.")
+    batch.add_argument("-o", "--output", help="Write CSV here instead of to stdout.")
+    batch.add_argument("--schedules", action="store_true",
+                       help="Write every installment instead of per-loan totals.")
+    batch.add_argument("--chunk-size", type=int, default=1000,
+                       help="Loans per vectorized block when writing schedules (default: 1000).")
+    batch.add_argument("--workers", type=int, default=1,
+                       help="Worker processes to spread the loans over (default: 1).")
+    batch.add_argument("--store", metavar="FILE",
+                       help="Save every schedule to a binary schedule store instead of writing CSV.")
+
+    stream = subcommands.add_parser("stream", help="Stream one loan's schedule as CSV or NDJSON.")
+    stream.add_argument("loan_amount", type=parse_amount, help="Loan amount.")
+    stream.add_argument("term_months", type=int, help="Term in months.")
+    stream.add_argument("annual_rate", type=float, help="Annual interest rate in percent.")
+    stream.add_argument("-o", "--output", help="Write here instead of to stdout.")
+    stream.add_argument("--format", choices=("csv", "ndjson"), default="csv",
+                        help="Output format (default: csv).")
+    stream.add_argument("--no-totals", action="store_true", help="Leave out the closing totals row.")
+    stream.add_argument("--chunk-size", type=int, default=4096,
+                        help="Installments computed per block (default: 4096).")
+
+    cashflow = subcommands.add_parser(
+        "cashflow", help="Project a portfolio's principal, interest and balance per calendar month."
+    )
+    cashflow.add_argument("input", help="CSV or Parquet file with loan_amount, term_months, annual_rate "
+                                        "and start_date (YYYY-MM or YYYY-MM-DD) columns.")
+    cashflow.add_argument("-o", "--output", help="Write CSV here instead of to stdout.")
+
+    show = subcommands.add_parser("show", help="Read schedules back from a binary schedule store.")
+    show.add_argument("store", help="Store file written by batch --store or the GUI.")
+    show.add_argument("--loan", type=int,
+                      help="Loan number, counting from 1 as in batch output. Without it, the loans are listed.")
+    show.add_argument("--installments", type=parse_installments, metavar="FIRST:LAST",
+                      help="Only these installments of the loan.")
+    show.add_argument("-o", "--output", help="Write here instead of to stdout.")
+    show.add_argument("--format", choices=("csv", "ndjson"), default="csv",
+                      help="Output format (default: csv).")
+    show.add_argument("--no-totals", action="store_true", help="Leave out the closing totals row.")
+
+    grid = subcommands.add_parser("grid", help="Sweep amount, term and rate ranges; write the grid as CSV.")
+    grid.add_argument("--amounts", required=True, metavar="RANGE",
+                      help="Loan amounts as start:stop:step or a space-separated list.")
+    grid.add_argument("--terms", required=True, metavar="RANGE", help="Terms in months, as above.")
+    grid.add_argument("--rates", required=True, metavar="RANGE", help="Annual rates in percent, as above.")
+    grid.add_argument("-o", "--output", help="Write CSV here instead of to stdout.")
+
+    serve = subcommands.add_parser("serve", help="Serve quotes over HTTP/JSON (see loan_server.py).")
+    serve.add_argument("--host", default="127.0.0.1", help="Address to listen on (default: 127.0.0.1).")
+    serve.add_argument("--port", type=int, default=8080, help="Port to listen on (default: 8080).")
+    serve.add_argument("--workers", type=int, default=2,
+                       help="Size of the pool that prices batches off the event loop (default: 2).")
+    serve.add_argument("--processes", action="store_true",
+                       help="Use worker processes instead of threads for the pool.")
+    serve.add_argument("--max-batch", type=int, default=4096,
+                       help="Loans that trigger a batch without waiting (default: 4096).")
+    serve.add_argument("--max-delay-ms", type=float, default=0.0,
+                       help="How long a quote may wait for others to batch with (default: 0, "
+                            "i.e. only requests already received are batched).")
+
+    args = parser.parse_args(argv)
+
+    timer = StageTimer() if args.profile or args.profile_stats else NULL_TIMER
+    profiler = None
+    if args.profile_stats:
+        import cProfile
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+    try:
+        run_command(parser, args, timer)
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(args.profile_stats)
+        if timer.enabled:
+            print_profile(timer, profiler)
+
+def print_profile(timer, profiler=None):
+    """
+    Prints the per-stage breakdown, and the costliest calls if cProfile ran,
+    to stderr so that CSV on stdout stays clean.
+    """
+    print("\n--- Profile ---", file=sys.stderr)
+    print(timer.report(), file=sys.stderr)
+    if profiler is not None:
+        import pstats
+
+        stats = pstats.Stats(profiler, stream=sys.stderr)
+        stats.sort_stats("cumulative").print_stats(15)
+
+def run_command(parser, args, timer):
+    """
+    Runs whatever main() parsed: the interactive calculator or a subcommand.
+    """
+    rounding = args.rounding if args.exact else None
+    if args.command is None:
+        cache = ScheduleCache(path=args.cache) if args.cache else None
+        try:
+            calculate_loan(cache, timer, rounding)
+        except ValueError as exc:
+            parser.error(str(exc))
+        finally:
+            if cache is not None:
+                cache.close()
+        return
+    if args.command == "serve":
+        from loan_server import QuoteServer
+
+        if args.workers <= 0 or args.max_batch <= 0 or args.max_delay_ms < 0:
+            parser.error("--workers and --max-batch must be positive and --max-delay-ms non-negative")
+        QuoteServer(args.host, args.port, args.workers, args.processes, args.max_batch,
+                    args.max_delay_ms / 1000, rounding).run()
+        return
+    if args.command == "show":
+        try:
+            store = ScheduleStore(args.store)
+        except (OSError, ValueError) as exc:
+            parser.error(str(exc))
+        if args.loan is not None and not 1 <= args.loan <= len(store):
+            parser.error(f"{args.store} holds loans 1 to {len(store)}")
+        if args.installments is not None:
+            if args.loan is None:
+                parser.error("--installments needs --loan")
+            term_months = int(store.term_months[args.loan - 1])
+            if args.installments[1] > term_months:
+                parser.error(f"loan {args.loan} has installments 1 to {term_months}")
+    elif args.command in ("grid", "cashflow") and rounding is not None:
+        parser.error(f"{args.command} uses closed-form totals and does not support --exact")
+    elif args.command == "cashflow":
+        try:
+            with timer.span("read"):
+                portfolio = read_portfolio(args.input)
+        except (OSError, ValueError) as exc:
+            parser.error(str(exc))
+    elif args.command == "grid":
+        try:
+            with timer.span("parse"):
+                axes = validate_axes(parse_range(args.amounts), parse_range(args.terms, integer=True),
+                                     parse_range(args.rates))
+        except ValueError as exc:
+            parser.error(str(exc))
+    elif args.chunk_size <= 0:
+        parser.error("--chunk-size must be a positive integer")
+    if args.command == "batch" and args.workers <= 0:
+        parser.error("--workers must be a positive integer")
+    if args.command == "stream" and (
+        not args.loan_amount > 0 or args.term_months <= 0 or not args.annual_rate >= 0
+        or not np.isfinite([args.loan_amount, args.annual_rate]).all()
+    ):
+        parser.error("loan amount and term must be positive, the interest rate non-negative "
+                     "and both finite")
+    if args.command == "batch" and args.store:
+        if args.output or args.workers != 1:
+            parser.error("--store cannot be combined with --output or --workers")
+        try:
+            store_batch(args.input, args.store, args.chunk_size, timer, rounding)
+        except (OSError, ValueError) as exc:
+            parser.error(str(exc))
+        return
+
+    out = open(args.output, "w", newline="") if args.output else sys.stdout
+    try:
+        if args.command == "show":
+            with timer.span("show"):
+                show_store(out, store, args)
+        elif args.command == "grid":
+            with timer.span("grid"):
+                write_grid(out, *axes)
+        elif args.command == "cashflow":
+            with timer.span("aggregate"):
+                months, flows = monthly_cash_flows(*portfolio)
+            with timer.span("write"):
+                write_cash_flows(out, months, flows)
+        elif args.command == "batch":
+            run_batch(args.input, out, schedules=args.schedules, chunk_size=args.chunk_size,
+                      workers=args.workers, timer=timer, rounding=rounding)
+        else:
+            writer = write_ndjson if args.format == "ndjson" else write_csv
+            if rounding is not None:
+                chunks = iter_exact_schedule_chunks(
+                    args.loan_amount, args.term_months, args.annual_rate, args.chunk_size, rounding
+                )
+            else:
+                chunks = iter_schedule_chunks(
+                    args.loan_amount, args.term_months, args.annual_rate, args.chunk_size
+                )
+            with timer.span("stream"):
+                writer(out, chunks, totals_row=not args.no_totals)
+    except BrokenPipeError:
+        # The reader went away (e.g. piped into head); stop quietly.
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+    except (OSError, ValueError) as exc:
+        parser.error(str(exc))
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+def show_store(out, store, args):
+    """
+    Writes one loan's schedule (or a range of its installments) from a
+    ScheduleStore, or the list of loans it holds when no loan is chosen.
+    """
+    if args.loan is None:
+        out.write(",".join(("Loan", "loan_amount", "term_months", "annual_rate")) + "\n")
+        numbers = np.arange(1, len(store) + 1)
+        for start in range(0, len(store), 100_000):
+            chunk = slice(start, start + 100_000)
+            np.savetxt(out, np.column_stack([numbers[chunk], store.loan_amounts[chunk],
+                                             store.term_months[chunk], store.annual_rates[chunk]]),
+                       fmt=["%d"] + list(TOTALS_FORMAT[:3]), delimiter=",")
+        return
+    schedule = store.schedule(args.loan - 1)
+    if args.installments is not None:
+        schedule = schedule[slice(*args.installments)]
+    writer = write_ndjson if args.format == "ndjson" else write_csv
+    writer(out, schedule.chunks(4096), totals_row=not args.no_totals)
+
 if __name__ == "__main__":
-    calculate_loan()
+    main()
@@ -1,242 +1,218 @@
+import queue
+import threading
+import time
 import tkinter as tk
-from tkinter import ttk, messagebox, filedialog
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-import matplotlib.pyplot as plt
-import pandas as pd
-
-class LoanCalculatorApp:
-    def __init__(self, root):
-        self.root = root
-        self.root.title("Loan Calculator")
-        self.root.geometry("900x700")
-        self.root.resizable(True, True)
-
-        self.dark_mode = False
-
-        # Main frame
-        self.frame = ttk.Frame(root, padding=10)
-        self.frame.grid(row=0, column=0, sticky="nsew")
-
-        # Configure root and frame for resizing
-        self.root.columnconfigure(0, weight=1)
-        self.root.rowconfigure(0, weight=1)
-        for col in range(5):
-            self.frame.columnconfigure(col, weight=1)
-        self.frame.rowconfigure(5, weight=1)  # Treeview row
-        self.frame.rowconfigure(6, weight=1)  # Graph row
-
-        # Inputs
-        ttk.Label(self.frame, text="Loan Amount:").grid(row=0, column=0, sticky="w")
-        self.loan_amount_var = tk.StringVar()
-        self.loan_amount_entry = ttk.Entry(self.frame, textvariable=self.loan_amount_var)
-        self.loan_amount_entry.grid(row=0, column=1, sticky="ew")
-
-        ttk.Label(self.frame, text="Term (months):").grid(row=1, column=0, sticky="w")
-        self.term_var = tk.StringVar()
-        self.term_entry = ttk.Entry(self.frame, textvariable=self.term_var)
-        self.term_entry.grid(row=1, column=1, sticky="ew")
+from tkinter import ttk, messagebox, filedialog, simpledialog
+
+import numpy as np
+
+from loan_cache import ScheduleCache, cache_inputs
+from loan_engine import Schedule, iter_schedule_chunks, reprice_schedule, schedule_totals
+from loan_export import ExportCancelled, save_csv, save_pdf, save_store, save_xlsx
+from loan_format import format_inr
+from loan_grid import GRID_METRICS, heatmap_slice, parse_range, sensitivity_grid
+from loan_store import STORE_SUFFIX, ScheduleStore
+from loan_timing import StageTimer
+
+POLL_INTERVAL_MS = 50   # how often the Tk loop collects finished chunks
+LIVE_DELAY_MS = 300     # pause in typing before a live recalculation
+CHUNK_ROWS = 2048       # installments computed per chunk on the worker thread
+CHART_WARMUP_MS = 200   # build the chart this long after start-up, once the form is up
+MIN_CHART_BUCKETS = 600  # downsampling buckets before the canvas has a real width
+
+def minmax_downsample(x, y, buckets):
+    """
+    Thins a line to at most 2 * buckets points. The points are split into
+    equal buckets and each keeps only its lowest and highest point, so peaks
+    and troughs survive.
+    """
+    n = len(y)
+    if n <= 2 * buckets:
+        return x, y
+    size = -(-n // buckets)
+    padded = np.empty(buckets * size, dtype=y.dtype)
+    padded[:n] = y
+    padded[n:] = y[-1]
+    rows = padded.reshape(buckets, size)
+    offsets = np.arange(buckets) * size
+    keep = np.concatenate([offsets + rows.argmin(axis=1), offsets + rows.argmax(axis=1)])
+    keep = np.unique(np.minimum(keep, n - 1))
+    return x[keep], y[keep]
+
+class CalculationJob:
+    """
+    Computes a schedule on a daemon thread and hands it back chunk by chunk
+    through a queue. A final None marks the end; an exception is passed
+    through instead if the computation fails. seconds is the time spent
+    computing, not waiting on the queue.
+    """
+
+    def __init__(self, loan_amount, term_months, annual_rate):
+        self.chunks = queue.Queue()
+        self.cancelled = threading.Event()
+        self.seconds = 0.0
+        self.thread = threading.Thread(
+            target=self.run, args=(loan_amount, term_months, annual_rate), daemon=True
+        )
+        self.thread.start()
 
-        ttk.Label(self.frame, text="Annual Interest Rate (%):").grid(row=2, column=0, sticky="w")
-        self.interest_var = tk.StringVar()
-        self.interest_entry = ttk.Entry(self.frame, textvariable=self.interest_var)
-        self.interest_entry.grid(row=2, column=1, sticky="ew")
+    def run(self, loan_amount, term_months, annual_rate):
+        try:
+            start = time.perf_counter()
+            for chunk in iter_schedule_chunks(loan_amount, term_months, annual_rate, CHUNK_ROWS):
+                self.seconds += time.perf_counter() - start
+                if self.cancelled.is_set():
+                    return
+                self.chunks.put(chunk)
+                start = time.perf_counter()
+        except Exception as exc:
+            self.chunks.put(exc)
+            return
+        self.chunks.put(None)
 
-        # Buttons
-        self.calc_btn = ttk.Button(self.frame, text="Calculate", command=self.calculate)
-        self.calc_btn.grid(row=3, column=0, columnspan=2, pady=10)
+    def cancel(self):
+        self.cancelled.set()
 
-        self.export_csv_btn = ttk.Button(self.frame, text="Export CSV", command=self.export_csv)
-        self.export_csv_btn.grid(row=3, column=2, pady=10)
+class VirtualTable:
+    """
+    Treeview that only keeps items for the rows in view (plus a small
+    buffer). Row values are fetched on demand from a callback, so a
+    10,000-row schedule costs no more to show than a 20-row one.
+    """
 
-        self.export_excel_btn = ttk.Button(self.frame, text="Export Excel", command=self.export_excel)
-        self.export_excel_btn.grid(row=3, column=3, pady=10)
+    def __init__(self, master, columns, buffer=5):
+        self.frame = ttk.Frame(master)
+        self.frame.columnconfigure(0, weight=1)
+        self.frame.rowconfigure(0, weight=1)
 
-        self.darkmode_btn = ttk.Button(self.frame, text="Toggle Dark Mode", command=self.toggle_dark_mode)
-        self.darkmode_btn.grid(row=3, column=4, pady=10)
-
-        # Table (Treeview)
-        columns = ("Inst.No", "Principal", "Interest", "Total", "Balance")
         self.tree = ttk.Treeview(self.frame, columns=columns, show="headings")
         for col in columns:
             self.tree.heading(col, text=col)
             self.tree.column(col, anchor="e")
-        self.tree.grid(row=5, column=0, columnspan=5, pady=10, sticky="nsew")
-
-        # Matplotlib figure
-        self.fig, self.ax = plt.subplots(figsize=(7,3))
-        self.canvas = FigureCanvasTkAgg(self.fig, master=self.frame)
-        self.canvas.get_tk_widget().grid(row=6, column=0, columnspan=5, sticky="nsew")
-
-        # Data container for export and chart
-        self.data = []
-
-    def calculate(self):
-        # Clear previous data
-        self.tree.delete(*self.tree.get_children())
-        self.ax.clear()
-        self.data.clear()
-
-        # Validate inputs
+        self.tree.grid(row=0, column=0, sticky="nsew")
+
+        self.scrollbar = ttk.Scrollbar(self.frame, orient="vertical", command=self.yview)
+        self.scrollbar.grid(row=0, column=1, sticky="ns")
+
+        self.buffer = buffer
+        self.row_count = 0
+        self.row_values = None
+        self.first = 0
+
+        self.tree.bind("<Configure>", lambda event: self.refresh())
+        self.tree.bind("<MouseWheel>", self._on_mousewheel)
+        self.tree.bind("<Button-4>", self._on_mousewheel)
+        self.tree.bind("<Button-5>", self._on_mousewheel)
+        for key, step in (("<Up>", -1), ("<Down>", 1), ("<Prior>", -10), ("<Next>", 10)):
+            self.tree.bind(key, lambda event, step=step: self._scroll_units(step))
+
+    def grid(self, **kwargs):
+        self.frame.grid(**kwargs)
+
+    def set_rows(self, row_count, row_values):
+        # row_values(index) must return the tuple shown for that row
+        self.row_count = row_count
+        self.row_values = row_values
+        self.first = 0
+        self.refresh()
+
+    def clear(self):
+        self.set_rows(0, None)
+
+    def update_row_count(self, row_count):
+        # Rows were appended; keep the current scroll position
+        self.row_count = row_count
+        self.refresh()
+
+    def visible_rows(self):
+        # Rows that fit below the heading; fall back to the requested height
+        # before the widget has been laid out.
+        row_height = int(ttk.Style().lookup("Treeview", "rowheight") or 20)
+        height = self.tree.winfo_height()
+        if height <= 1:
+            return int(self.tree.cget("height"))
+        return max(1, (height - row_height) // row_height)
+
+    def refresh(self):
+        visible = self.visible_rows()
+        self.first = max(0, min(self.first, self.row_count - visible))
+        wanted = max(0, min(visible + self.buffer, self.row_count - self.first))
+
+        # Reuse the existing items; only add or drop the difference
+        items = self.tree.get_children()
+        if len(items) > wanted:
+            self.tree.delete(*items[wanted:])
+            items = items[:wanted]
+        for offset, iid in enumerate(items):
+            self.tree.item(iid, values=self.row_values(self.first + offset))
+        for offset in range(len(items), wanted):
+            self.tree.insert("", "end", values=self.row_values(self.first + offset))
+        self.tree.yview_moveto(0)
+
+        if self.row_count:
+            self.scrollbar.set(self.first / self.row_count,
+                               min(1.0, (self.first + visible) / self.row_count))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+    def yview(self, *args):
+        # Scrollbar protocol: ("moveto", fraction) or ("scroll", n, "units"/"pages")
+        if args[0] == "moveto":
+            self.first = int(float(args[1]) * self.row_count)
+            self.refresh()
+        elif args[0] == "scroll":
+            step = int(args[1])
+            if args[2] == "pages":
+                step *= self.visible_rows()
+            self._scroll_units(step)
+
+    def _scroll_units(self, step):
+        self.first += step
+        self.refresh()
+        return "break"
+
+    def _on_mousewheel(self, event):
+        if event.num == 4 or (event.num != 5 and event.delta > 0):
+            return self._scroll_units(-3)
+        return self._scroll_units(3)
+
+class ExportJob:
+    """
+    Runs one of the loan_export savers on a daemon thread. Progress and the
+    outcome ("done", "cancelled" or "error") come back through a queue as
+    (kind, value) pairs. seconds is the time the save took.
+    """
+
+    def __init__(self, save, path, schedule):
+        self.path = path
+        self.messages = queue.Queue()
+        self.seconds = 0.0
+        self.cancelled = threading.Event()
+        self.thread = threading.Thread(target=self.run, args=(save, schedule), daemon=True)
+        self.thread.start()
+
+    def run(self, save, schedule):
+        start = time.perf_counter()
         try:
-            loan_amount = float(self.loan_amount_var.get().replace(',', ''))
-            term_months = int(self.term_var.get())
-            annual_rate = float(self.interest_var.get())
-            if loan_amount <= 0 or term_months <= 0 or annual_rate < 0:
-                raise ValueError
-        except ValueError:
-            messagebox.showerror("Invalid input", "Please enter valid positive numbers.")
-            return
-
-        principal_per_installment = loan_amount / term_months
-        balance = loan_amount
-        monthly_rate = annual_rate / 100 / 12
-
-        total_principal = 0
-        total_interest = 0
-        total_payment = 0
-
-        for i in range(1, term_months + 1):
-            interest = balance * monthly_rate
-            total = principal_per_installment + interest
-            balance -= principal_per_installment
-            if balance < 0:
-                balance = 0.0
-
-            # Round values and format INR style (Indian numbering)
-            p = round(principal_per_installment, 2)
-            it = round(interest, 2)
-            tot = round(total, 2)
-            bal = round(balance, 2)
-
-            # Store for export/chart
-            self.data.append({
-                "Inst.No": i,
-                "Principal": p,
-                "Interest": it,
-                "Total": tot,
-                "Balance": bal,
-            })
-
-            self.tree.insert("", "end", values=(
-                i,
-                self.format_inr(p),
-                self.format_inr(it),
-                self.format_inr(tot),
-                self.format_inr(bal),
-            ))
-
-            total_principal += p
-            total_interest += it
-            total_payment += tot
-
-        # Insert totals row
-        self.tree.insert("", "end", values=(
-            "Total",
-            self.format_inr(total_principal),
-            self.format_inr(total_interest),
-            self.format_inr(total_payment),
-            ""
-        ))
-
-        # Plot graph: Principal and Interest over installments
-        installments = [row["Inst.No"] for row in self.data]
-        principals = [row["Principal"] for row in self.data]
-        interests = [row["Interest"] for row in self.data]
-
-        self.ax.plot(installments, principals, label="Principal")
-        self.ax.plot(installments, interests, label="Interest")
-        self.ax.set_xlabel("Installment No")
-        self.ax.set_ylabel("Amount (₹)")
-        self.ax.set_title("Principal and Interest over time")
-        self.ax.legend()
-        self.ax.grid(True)
-
-        self.canvas.draw()
-
-    def format_inr(self, amount):
-        # Format number with commas in Indian style e.g. 1,23,456.78
-        s = f"{amount:,.2f}"
-        # Fix for Indian comma style:
-        # swap first comma to last occurrence of comma in first 3 digits
-        parts = s.split(".")
-        integer_part = parts[0].replace(",", "")
-        if len(integer_part) > 3:
-            # Last 3 digits
-            last3 = integer_part[-3:]
-            rest = integer_part[:-3]
-            # Insert commas every 2 digits in 'rest'
-            rest_with_commas = ""
-            while len(rest) > 2:
-                rest_with_commas = "," + rest[-2:] + rest_with_commas
-                rest = rest[:-2]
-            rest_with_commas = rest + rest_with_commas
-            integer_part = rest_with_commas + "," + last3
-        return integer_part + "." + parts[1]
-
-    def export_csv(self):
-        if not self.data:
-            messagebox.showwarning("No data", "Please calculate first before exporting.")
-            return
-        path = filedialog.asksaveasfilename(
-            defaultextension=".csv",
-            filetypes=[("CSV files", "*.csv"), ("All files", "*.*")]
-        )
-        if not path:
-            return
-        df = pd.DataFrame(self.data)
-        df.to_csv(path, index=False)
-        messagebox.showinfo("Exported", f"Data exported to {path}")
-
-    def export_excel(self):
-        if not self.data:
-            messagebox.showwarning("No data", "Please calculate first before exporting.")
-            return
-        path = filedialog.asksaveasfilename(
-            defaultextension=".xlsx",
-            filetypes=[("Excel files", "*.xlsx"), ("All files", "*.*")]
-        )
-        if not path:
-            return
-        df = pd.DataFrame(self.data)
-        df.to_excel(path, index=False)
-        messagebox.showinfo("Exported", f"Data exported to {path}")
-
-    def toggle_dark_mode(self):
-        self.dark_mode = not self.dark_mode
-        style = ttk.Style()
-
-        if self.dark_mode:
-            self.root.configure(bg="#2E2E2E")
-            style.theme_use('clam')
-            style.configure('.', background='#2E2E2E', foreground='white')
-            style.configure('Treeview', background='#424242', foreground='white', fieldbackground='#424242')
-            style.map('Treeview', background=[('selected', '#6A9FB5')], foreground=[('selected', 'white')])
+            save(self.path, schedule.chunks(CHUNK_ROWS), progress=self.progress)
+            self.seconds = time.perf_counter() - start
+        except ExportCancelled:
+            self.messages.put(("cancelled", None))
+        except Exception as exc:
+            self.messages.put(("error", exc))
         else:
-            self.root.configure(bg="SystemButtonFace")
-            style.theme_use('default')
-            style.configure('.', background='SystemButtonFace', foreground='black')
-            style.configure('Treeview', background='white', foreground='black', fieldbackground='white')
-            style.map('Treeview', background=[('selected', '#347083')], foreground=[('selected', 'white')])
+            self.messages.put(("done", None))
 
-        # Refresh widgets background if needed
-        for widget in self.frame.winfo_children():
-            try:
-                widget.configure(background=self.root['bg'])
-            except:
-                pass
+    def progress(self, rows):
+        if self.cancelled.is_set():
+            raise ExportCancelled
+        self.messages.put(("progress", rows))
 
-if __name__ == "__main__":
-    root = tk.Tk()
-    app = LoanCalculatorApp(root)
-    root.mainloop()
-import tkinter as tk
-from tkinter import ttk, messagebox, filedialog
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-import matplotlib.pyplot as plt
-import pandas as pd
+    def cancel(self):
+        self.cancelled.set()
 
 class LoanCalculatorApp:
-    def __init__(self, root):
+    def __init__(self, root, cache=None):
         self.root = root
         self.root.title("Loan Calculator")
         self.root.geometry("900x700")
@@ -272,9 +248,31 @@ class LoanCalculatorApp:
         self.interest_entry = ttk.Entry(self.frame, textvariable=self.interest_var)
         self.interest_entry.grid(row=2, column=1, sticky="ew")
 
+        # Scenario sweep: ranges (start:stop:step or a list) for a sensitivity
+        # grid drawn as a heatmap beside the chart; an empty range uses the
+        # value on the left
+        self.range_vars = []
+        for row, label in enumerate(("Amount range:", "Term range:", "Rate range:")):
+            ttk.Label(self.frame, text=label).grid(row=row, column=2, sticky="e", padx=(10, 0))
+            range_var = tk.StringVar()
+            ttk.Entry(self.frame, textvariable=range_var).grid(row=row, column=3, sticky="ew")
+            self.range_vars.append(range_var)
+
+        self.sweep_metric_var = tk.StringVar(value=GRID_METRICS[0])
+        self.sweep_metric = ttk.Combobox(self.frame, textvariable=self.sweep_metric_var,
+                                         values=GRID_METRICS, state="readonly")
+        self.sweep_metric.grid(row=0, column=4, sticky="ew", padx=(10, 0))
+        self.sweep_metric.bind("<<ComboboxSelected>>", lambda event: self.draw_heatmap())
+
+        self.sweep_btn = ttk.Button(self.frame, text="Sweep", command=self.sweep)
+        self.sweep_btn.grid(row=1, column=4)
+
         # Buttons
-        self.calc_btn = ttk.Button(self.frame, text="Calculate", command=self.calculate)
-        self.calc_btn.grid(row=3, column=0, columnspan=2, pady=10)
+        self.calc_btn = ttk.Button(self.frame, text="Calculate", command=self.on_calc_button)
+        self.calc_btn.grid(row=3, column=0, pady=10)
+
+        self.open_store_btn = ttk.Button(self.frame, text="Open Store", command=self.open_store)
+        self.open_store_btn.grid(row=3, column=1, pady=10)
 
         self.export_csv_btn = ttk.Button(self.frame, text="Export CSV", command=self.export_csv)
         self.export_csv_btn.grid(row=3, column=2, pady=10)
@@ -285,152 +283,483 @@ class LoanCalculatorApp:
         self.darkmode_btn = ttk.Button(self.frame, text="Toggle Dark Mode", command=self.toggle_dark_mode)
         self.darkmode_btn.grid(row=3, column=4, pady=10)
 
-        # Table (Treeview)
+        self.live_var = tk.BooleanVar(value=False)
+        self.live_check = ttk.Checkbutton(self.frame, text="Live update", variable=self.live_var,
+                                          command=self.on_input_change)
+        self.live_check.grid(row=4, column=0, sticky="w")
+
+        self.export_store_btn = ttk.Button(self.frame, text="Save Store", command=self.export_store)
+        self.export_store_btn.grid(row=4, column=1)
+
+        self.export_pdf_btn = ttk.Button(self.frame, text="Export PDF", command=self.export_pdf)
+        self.export_pdf_btn.grid(row=4, column=2)
+
+        self.export_progress = ttk.Progressbar(self.frame, mode="determinate")
+        self.export_progress.grid(row=4, column=3, sticky="ew")
+
+        self.export_cancel_btn = ttk.Button(self.frame, text="Cancel Export", command=self.cancel_export,
+                                            state="disabled")
+        self.export_cancel_btn.grid(row=4, column=4)
+
+        # Table (virtual Treeview: only the rows in view exist as items)
         columns = ("Inst.No", "Principal", "Interest", "Total", "Balance")
-        self.tree = ttk.Treeview(self.frame, columns=columns, show="headings")
-        for col in columns:
-            self.tree.heading(col, text=col)
-            self.tree.column(col, anchor="e")
-        self.tree.grid(row=5, column=0, columnspan=5, pady=10, sticky="nsew")
+        self.table = VirtualTable(self.frame, columns)
+        self.table.grid(row=5, column=0, columnspan=5, pady=10, sticky="nsew")
+        self.tree = self.table.tree
+
+        # Matplotlib figure, created by ensure_chart() after the window is shown
+        self.fig = None
+        self.ax = None
+        self.canvas = None
+
+        # Last sweep (loan_grid.sensitivity_grid) and its heatmap, added to the figure on first use
+        self.sweep_grid = None
+        self.sweep_axes = None
+        self.heat_ax = None
+        self.heat_image = None
+        self.heat_colorbar = None
+        self.heat_ticks = None
+        self.root.after(CHART_WARMUP_MS, self.ensure_chart)
+
+        # Columnar schedule (loan_engine.Schedule) shared by table, chart and exports
+        self.data = None
+        self.totals_values = None
+        self.table.set_rows(0, self.row_values)
+
+        # Background calculation in flight (CalculationJob) and its output buffer
+        self.job = None
+        self.job_params = None
+        self.job_progressive = True
+        self.result = None
+        self.rows_ready = 0
+
+        # Export running in the background (ExportJob)
+        self.export_job = None
+
+        # Status bar with the last run's per-stage timings (loan_timing.StageTimer)
+        self.timer = StageTimer()
+        self.status_var = tk.StringVar()
+        self.status_bar = ttk.Label(self.frame, textvariable=self.status_var, anchor="w")
+        self.status_bar.grid(row=7, column=0, columnspan=5, sticky="ew")
+
+        # Recently computed schedules (loan_cache.ScheduleCache)
+        self.cache = cache if cache is not None else ScheduleCache()
+
+        # Inputs behind self.data, and the chart's (principal, interest) lines
+        self.params = None
+        self.lines = None
+
+        # Rounding policy of a schedule opened from an exact store, or None.
+        # Only float schedules may be repriced in place (reprice_schedule).
+        self.rounding = None
+
+        # Live mode: recalculate shortly after any input changes
+        self.live_after_id = None
+        for var in (self.loan_amount_var, self.term_var, self.interest_var):
+            var.trace_add("write", self.on_input_change)
+
+    def on_calc_button(self):
+        # The button reads "Cancel" while a calculation is running
+        if self.job is not None:
+            self.cancel_calculation()
+            self.clear_results()
+        else:
+            self.calculate()
+
+    def cancel_calculation(self):
+        if self.job is not None:
+            self.job.cancel()
+            self.job = None
+        self.calc_btn.configure(text="Calculate")
+
+    def ensure_chart(self):
+        # matplotlib takes most of the start-up time, so it is only imported
+        # here; Figure avoids pulling in pyplot and its global state
+        if self.canvas is not None:
+            return
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 
-        # Matplotlib figure
-        self.fig, self.ax = plt.subplots(figsize=(7,3))
+        self.fig = Figure(figsize=(7, 3))
+        self.ax = self.fig.add_subplot()
         self.canvas = FigureCanvasTkAgg(self.fig, master=self.frame)
         self.canvas.get_tk_widget().grid(row=6, column=0, columnspan=5, sticky="nsew")
 
-        # Data container for export and chart
-        self.data = []
+        # The axes are set up once; draw_chart() only swaps the line data
+        principal_line, = self.ax.plot([], [], label="Principal")
+        interest_line, = self.ax.plot([], [], label="Interest")
+        self.lines = (principal_line, interest_line)
+        self.ax.set_xlabel("Installment No")
+        self.ax.set_ylabel("Amount (₹)")
+        self.ax.set_title("Principal and Interest over time")
+        self.ax.legend()
+        self.ax.grid(True)
+        self.canvas.draw_idle()
+
+    def clear_results(self):
+        self.table.set_rows(0, self.row_values)
+        if self.canvas is not None:
+            for line in self.lines:
+                line.set_data([], [])
+            self.canvas.draw_idle()
+        self.data = None
+        self.params = None
+        self.rounding = None
+        self.totals_values = None
+
+    def read_inputs(self):
+        # Returns (loan_amount, term_months, annual_rate); raises ValueError
+        loan_amount = float(self.loan_amount_var.get().replace(',', ''))
+        term_months = int(self.term_var.get())
+        annual_rate = float(self.interest_var.get())
+        if loan_amount <= 0 or term_months <= 0 or annual_rate < 0:
+            raise ValueError
+        if not np.isfinite([loan_amount, annual_rate]).all():
+            raise ValueError
+        return loan_amount, term_months, annual_rate
 
     def calculate(self):
-        # Clear previous data
-        self.tree.delete(*self.tree.get_children())
-        self.ax.clear()
-        self.data.clear()
+        # A new calculation replaces any still in flight
+        self.cancel_calculation()
+        self.clear_results()
 
         # Validate inputs
+        self.timer.reset()
         try:
-            loan_amount = float(self.loan_amount_var.get().replace(',', ''))
-            term_months = int(self.term_var.get())
-            annual_rate = float(self.interest_var.get())
-            if loan_amount <= 0 or term_months <= 0 or annual_rate < 0:
-                raise ValueError
+            with self.timer.span("inputs"):
+                params = self.read_inputs()
         except ValueError:
             messagebox.showerror("Invalid input", "Please enter valid positive numbers.")
             return
 
-        principal_per_installment = loan_amount / term_months
-        balance = loan_amount
-        monthly_rate = annual_rate / 100 / 12
-
-        total_principal = 0
-        total_interest = 0
-        total_payment = 0
-
-        for i in range(1, term_months + 1):
-            interest = balance * monthly_rate
-            total = principal_per_installment + interest
-            balance -= principal_per_installment
-            if balance < 0:
-                balance = 0.0
-
-            # Round values and format INR style (Indian numbering)
-            p = round(principal_per_installment, 2)
-            it = round(interest, 2)
-            tot = round(total, 2)
-            bal = round(balance, 2)
-
-            # Store for export/chart
-            self.data.append({
-                "Inst.No": i,
-                "Principal": p,
-                "Interest": it,
-                "Total": tot,
-                "Balance": bal,
-            })
-
-            self.tree.insert("", "end", values=(
-                i,
-                self.format_inr(p),
-                self.format_inr(it),
-                self.format_inr(tot),
-                self.format_inr(bal),
-            ))
-
-            total_principal += p
-            total_interest += it
-            total_payment += tot
-
-        # Insert totals row
-        self.tree.insert("", "end", values=(
-            "Total",
-            self.format_inr(total_principal),
-            self.format_inr(total_interest),
-            self.format_inr(total_payment),
-            ""
-        ))
+        self.start_calculation(params, progressive=True)
 
-        # Plot graph: Principal and Interest over installments
-        installments = [row["Inst.No"] for row in self.data]
-        principals = [row["Principal"] for row in self.data]
-        interests = [row["Interest"] for row in self.data]
+    def start_calculation(self, params, progressive):
+        with self.timer.span("cache"):
+            cached = self.cache.get(*params)
+        if cached is not None:
+            self.data = cached
+            self.params = params
+            self.rounding = None
+            self.finish_calculation()
+            return
 
-        self.ax.plot(installments, principals, label="Principal")
-        self.ax.plot(installments, interests, label="Interest")
-        self.ax.set_xlabel("Installment No")
-        self.ax.set_ylabel("Amount (₹)")
-        self.ax.set_title("Principal and Interest over time")
-        self.ax.legend()
-        self.ax.grid(True)
+        # Compute off the Tk thread; poll_calculation() collects the chunks.
+        # Progressive jobs show rows as they arrive, others swap in at the end.
+        # The inputs are rounded as the cache key rounds them (cache_inputs).
+        self.result = Schedule.allocate(params[1])
+        self.rows_ready = 0
+        self.job = CalculationJob(*cache_inputs(*params))
+        self.job_params = params
+        self.job_progressive = progressive
+        self.calc_btn.configure(text="Cancel")
+        self.root.after(POLL_INTERVAL_MS, self.poll_calculation, self.job)
+
+    def poll_calculation(self, job):
+        if job is not self.job:
+            return  # cancelled or replaced by a newer calculation
+
+        finished = False
+        rows_before = self.rows_ready
+        try:
+            with self.timer.span("collect"):
+                while True:
+                    chunk = job.chunks.get_nowait()
+                    if isinstance(chunk, Exception):
+                        self.cancel_calculation()
+                        messagebox.showerror("Calculation failed", str(chunk))
+                        return
+                    if chunk is None:
+                        finished = True
+                        break
+                    self.result.put(self.rows_ready, chunk)
+                    self.rows_ready += len(chunk)
+        except queue.Empty:
+            pass
+
+        if finished:
+            self.timer.add("schedule", job.seconds)
+            self.data = self.result
+            self.params = self.job_params
+            self.rounding = None
+            self.cache.put(*self.params, self.data)
+            self.finish_calculation()
+            return
+        # Show what is ready so far; the table and chart fill in as chunks arrive
+        if self.job_progressive and self.rows_ready > rows_before:
+            self.data = self.result[:self.rows_ready]
+            with self.timer.span("table"):
+                self.table.update_row_count(self.rows_ready)
+            self.draw_chart()
+        self.root.after(POLL_INTERVAL_MS, self.poll_calculation, job)
+
+    def finish_calculation(self, what="calculation"):
+        self.job = None
+        self.calc_btn.configure(text="Calculate")
+        self.show_totals()
+
+        # Installment rows plus the totals row, formatted only when scrolled into view
+        with self.timer.span("table"):
+            self.table.update_row_count(len(self.data) + 1)
+        self.draw_chart()
+        self.show_timings(what)
+
+    def show_totals(self):
+        with self.timer.span("totals"):
+            total_principal, total_interest, total_payment = schedule_totals(self.data)
+        self.totals_values = (
+            "Total",
+            format_inr(total_principal),
+            format_inr(total_interest),
+            format_inr(total_payment),
+            ""
+        )
 
-        self.canvas.draw()
-
-    def format_inr(self, amount):
-        # Format number with commas in Indian style e.g. 1,23,456.78
-        s = f"{amount:,.2f}"
-        # Fix for Indian comma style:
-        # swap first comma to last occurrence of comma in first 3 digits
-        parts = s.split(".")
-        integer_part = parts[0].replace(",", "")
-        if len(integer_part) > 3:
-            # Last 3 digits
-            last3 = integer_part[-3:]
-            rest = integer_part[:-3]
-            # Insert commas every 2 digits in 'rest'
-            rest_with_commas = ""
-            while len(rest) > 2:
-                rest_with_commas = "," + rest[-2:] + rest_with_commas
-                rest = rest[:-2]
-            rest_with_commas = rest + rest_with_commas
-            integer_part = rest_with_commas + "," + last3
-        return integer_part + "." + parts[1]
+    def on_input_change(self, *args):
+        # Debounce: only recalculate once typing pauses
+        if not self.live_var.get():
+            return
+        if self.live_after_id is not None:
+            self.root.after_cancel(self.live_after_id)
+        self.live_after_id = self.root.after(LIVE_DELAY_MS, self.live_recalculate)
+
+    def read_sweep_ranges(self):
+        # Returns (amounts, terms, rates) arrays; raises ValueError with a message
+        main_vars = (self.loan_amount_var, self.term_var, self.interest_var)
+        axes = []
+        for range_var, main_var, integer in zip(self.range_vars, main_vars, (False, True, False)):
+            axes.append(parse_range(range_var.get().strip() or main_var.get(), integer))
+        return axes
+
+    def sweep(self):
+        self.timer.reset()
+        try:
+            with self.timer.span("inputs"):
+                axes = self.read_sweep_ranges()
+            with self.timer.span("sweep"):
+                self.sweep_grid = sensitivity_grid(*axes)
+        except ValueError as exc:
+            messagebox.showerror("Invalid range", str(exc))
+            return
+        self.sweep_axes = axes
+        self.draw_heatmap()
+        self.show_timings("sweep")
+
+    def draw_heatmap(self):
+        # The heatmap shares the chart's figure: the first sweep moves the
+        # line chart to the left half and adds the heatmap on the right
+        if self.sweep_grid is None:
+            return
+        with self.timer.span("heatmap"):
+            self.ensure_chart()
+            if self.heat_ax is None:
+                from matplotlib.ticker import FuncFormatter, MaxNLocator
+
+                layout = self.fig.add_gridspec(1, 2)
+                self.ax.set_subplotspec(layout[0])
+                self.heat_ax = self.fig.add_subplot(layout[1])
+                self.fig.set_layout_engine("constrained")
+                self.heat_image = self.heat_ax.imshow(
+                    np.zeros((1, 1)), aspect="auto", origin="lower", interpolation="nearest"
+                )
+                self.heat_colorbar = self.fig.colorbar(self.heat_image, ax=self.heat_ax)
+                # Tick labels show range values, not cell indexes
+                for axis, name in ((self.heat_ax.xaxis, "x"), (self.heat_ax.yaxis, "y")):
+                    axis.set_major_locator(MaxNLocator(nbins=6, integer=True))
+                    axis.set_major_formatter(
+                        FuncFormatter(lambda position, _, name=name: self.heatmap_tick(name, position))
+                    )
+
+            metric = self.sweep_metric_var.get()
+            values, (y_name, y_values), (x_name, x_values), (fixed_name, fixed_value) = heatmap_slice(
+                self.sweep_grid, self.sweep_axes, metric
+            )
+            self.heat_ticks = {"x": x_values, "y": y_values}
+            rows, cols = values.shape
+            self.heat_image.set_data(values)
+            self.heat_image.set_extent((-0.5, cols - 0.5, -0.5, rows - 0.5))
+            self.heat_image.set_clim(values.min(), values.max())
+            self.heat_colorbar.update_normal(self.heat_image)
+            self.heat_ax.set_xlabel(x_name.replace("_", " "))
+            self.heat_ax.set_ylabel(y_name.replace("_", " "))
+            self.heat_ax.set_title(
+                f"{metric.replace('_', ' ')}, {fixed_name.replace('_', ' ')} {fixed_value:g}", fontsize=9
+            )
+            self.canvas.draw_idle()
+
+    def heatmap_tick(self, axis, position):
+        axis_values = self.heat_ticks[axis]
+        index = int(round(position))
+        return f"{axis_values[index]:g}" if 0 <= index < len(axis_values) else ""
+
+    def show_timings(self, what):
+        # Status bar readout of the stages timed since the last reset
+        self.status_var.set(f"Last {what}: {self.timer.summary()}")
+
+    def live_recalculate(self):
+        self.live_after_id = None
+        self.timer.reset()
+        try:
+            with self.timer.span("inputs"):
+                params = self.read_inputs()
+        except ValueError:
+            return  # half-typed input; wait for the next change
+        if params == self.params and self.job is None:
+            return
 
-    def export_csv(self):
-        if not self.data:
-            messagebox.showwarning("No data", "Please calculate first before exporting.")
+        old = self.params
+        if old is not None and self.job is None and self.rounding is None and params[:2] == old[:2]:
+            # Only the rate moved: reuse the rate-independent columns and
+            # patch the visible rows and chart lines in place. An exact
+            # schedule's columns are not the float ones, so it is recomputed.
+            with self.timer.span("cache"):
+                repriced = self.cache.get(*params)
+            if repriced is None:
+                with self.timer.span("schedule"):
+                    repriced = reprice_schedule(self.data, *cache_inputs(*params))
+                self.cache.put(*params, repriced)
+            self.data = repriced
+            self.params = params
+            self.show_totals()
+            with self.timer.span("table"):
+                self.table.refresh()
+            self.draw_chart()
+            self.show_timings("calculation")
             return
-        path = filedialog.asksaveasfilename(
-            defaultextension=".csv",
-            filetypes=[("CSV files", "*.csv"), ("All files", "*.*")]
+
+        # Amount or term changed: every row moves (principal is amount / term),
+        # so recompute in the background and swap the result in when done
+        self.cancel_calculation()
+        self.start_calculation(params, progressive=self.data is None)
+
+    def draw_chart(self):
+        # Plot graph: Principal and Interest over installments. The lines are
+        # only given new data, thinned to about two points per pixel, so the
+        # redraw costs the same for 60 rows or 100k.
+        # The timing covers preparing the lines; the canvas renders when idle.
+        with self.timer.span("chart"):
+            self.ensure_chart()
+            buckets = max(self.canvas.get_tk_widget().winfo_width(), MIN_CHART_BUCKETS)
+            installments = self.data["Inst.No"]
+            principal_line, interest_line = self.lines
+            principal_line.set_data(*minmax_downsample(installments, self.data["Principal"], buckets))
+            interest_line.set_data(*minmax_downsample(installments, self.data["Interest"], buckets))
+            self.ax.relim()
+            self.ax.autoscale_view()
+            self.canvas.draw_idle()
+
+    def row_values(self, index):
+        if index == len(self.data):
+            return self.totals_values
+        i, p, it, tot, bal = self.data[index].values()
+        return (i, format_inr(p), format_inr(it), format_inr(tot), format_inr(bal))
+
+    def open_store(self):
+        # Shows one loan of a binary schedule store (loan_store.py). The
+        # schedule stays memory-mapped: only the rows in view are read.
+        path = filedialog.askopenfilename(
+            filetypes=[("Schedule stores", "*" + STORE_SUFFIX), ("All files", "*.*")]
         )
         if not path:
             return
-        df = pd.DataFrame(self.data)
-        df.to_csv(path, index=False)
-        messagebox.showinfo("Exported", f"Data exported to {path}")
+        self.timer.reset()
+        try:
+            with self.timer.span("open"):
+                store = ScheduleStore(path)
+        except (OSError, ValueError) as exc:
+            messagebox.showerror("Open failed", str(exc))
+            return
+        if len(store) == 0:
+            messagebox.showerror("Open failed", f"{path} holds no loans.")
+            return
+        index = 0
+        if len(store) > 1:
+            number = simpledialog.askinteger(
+                "Open Store", f"Loan number (1 to {len(store)}):",
+                parent=self.root, minvalue=1, maxvalue=len(store),
+            )
+            if number is None:
+                return
+            index = number - 1
+
+        self.cancel_calculation()
+        self.clear_results()
+        with self.timer.span("open"):
+            self.data = store.schedule(index)
+        self.params = store.loan(index)
+        self.rounding = store.rounding
+        # Matching inputs, so live mode sees nothing to recalculate; an
+        # amount with fractions of a paisa keeps all its digits
+        loan_amount, term_months, annual_rate = self.params
+        amount_text = f"{loan_amount:.2f}"
+        self.loan_amount_var.set(amount_text if float(amount_text) == loan_amount else repr(loan_amount))
+        self.term_var.set(str(term_months))
+        self.interest_var.set(str(annual_rate))
+        self.finish_calculation("open")
+
+    def export_store(self):
+        # The store records the inputs along with the rows; see loan_store.py
+        params, rounding = self.params, self.rounding
+
+        def save(path, chunks, progress=None):
+            return save_store(path, chunks, *params, rounding, progress=progress)
+
+        self.start_export(save, STORE_SUFFIX, [("Schedule stores", "*" + STORE_SUFFIX), ("All files", "*.*")])
+
+    def export_csv(self):
+        self.start_export(save_csv, ".csv", [("CSV files", "*.csv"), ("All files", "*.*")])
 
     def export_excel(self):
+        self.start_export(save_xlsx, ".xlsx", [("Excel files", "*.xlsx"), ("All files", "*.*")])
+
+    def export_pdf(self):
+        self.start_export(save_pdf, ".pdf", [("PDF files", "*.pdf"), ("All files", "*.*")])
+
+    def start_export(self, save, extension, filetypes):
+        if self.job is not None:
+            messagebox.showwarning("Busy", "Please wait for the calculation to finish.")
+            return
+        if self.export_job is not None:
+            messagebox.showwarning("Busy", "Please wait for the current export to finish.")
+            return
         if not self.data:
             messagebox.showwarning("No data", "Please calculate first before exporting.")
             return
-        path = filedialog.asksaveasfilename(
-            defaultextension=".xlsx",
-            filetypes=[("Excel files", "*.xlsx"), ("All files", "*.*")]
-        )
+        path = filedialog.asksaveasfilename(defaultextension=extension, filetypes=filetypes)
         if not path:
             return
-        df = pd.DataFrame(self.data)
-        df.to_excel(path, index=False)
-        messagebox.showinfo("Exported", f"Data exported to {path}")
+
+        # Write on a worker thread; poll_export() moves the progress bar
+        self.export_progress.configure(maximum=len(self.data), value=0)
+        self.export_cancel_btn.configure(state="normal")
+        self.export_job = ExportJob(save, path, self.data)
+        self.root.after(POLL_INTERVAL_MS, self.poll_export, self.export_job)
+
+    def cancel_export(self):
+        if self.export_job is not None:
+            self.export_job.cancel()
+
+    def poll_export(self, job):
+        try:
+            while True:
+                kind, value = job.messages.get_nowait()
+                if kind == "progress":
+                    self.export_progress.configure(value=value)
+                    continue
+                self.export_job = None
+                self.export_cancel_btn.configure(state="disabled")
+                self.export_progress.configure(value=0)
+                if kind == "done":
+                    self.timer.reset()
+                    self.timer.add("export", job.seconds)
+                    self.show_timings("export")
+                    messagebox.showinfo("Exported", f"Data exported to {job.path}")
+                elif kind == "error":
+                    messagebox.showerror("Export failed", str(value))
+                return
+        except queue.Empty:
+            pass
+        self.root.after(POLL_INTERVAL_MS, self.poll_export, job)
 
     def toggle_dark_mode(self):
         self.dark_mode = not self.dark_mode
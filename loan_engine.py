@@ -0,0 +1,366 @@
+"""
+Headless amortization engine shared by the CLI and GUI front ends.
+
+Only NumPy is imported here, so the schedule math can be used without
+tkinter, matplotlib or pandas.
+"""
+import numpy as np
+
+COLUMNS = ("Inst.No", "Principal", "Interest", "Total", "Balance")
+COLUMN_DTYPES = {col: np.dtype(np.int32 if col == "Inst.No" else np.float64) for col in COLUMNS}
+
+# Rounding policies for the exact (integer paise) mode
+ROUND_HALF_UP = "half_up"       # 0.5 paisa rounds away from zero
+ROUND_HALF_EVEN = "half_even"   # 0.5 paisa rounds to the even paisa (banker's rounding)
+ROUND_DOWN = "down"             # fractions of a paisa are dropped
+ROUNDING_POLICIES = (ROUND_HALF_UP, ROUND_HALF_EVEN, ROUND_DOWN)
+
+# Exact mode holds annual rates as whole units of 1e-4 percent, so interest
+# is opening_paise * rate_units / (1200 * RATE_SCALE) in integer arithmetic
+RATE_SCALE = 10_000
+
+
+class Schedule:
+    """
+    Amortization schedule stored as one typed NumPy array per column.
+
+    schedule["Interest"] returns the column array itself (no copy),
+    schedule[i] a lightweight ScheduleRow view of installment i, and
+    schedule[a:b] a Schedule sharing the same arrays.
+    """
+    __slots__ = ("columns",)
+
+    def __init__(self, columns):
+        self.columns = columns
+
+    @classmethod
+    def allocate(cls, row_count):
+        """Uninitialized schedule of row_count rows, to be filled with put()."""
+        return cls({col: np.empty(row_count, dtype=COLUMN_DTYPES[col]) for col in COLUMNS})
+
+    def __len__(self):
+        return len(self.columns["Inst.No"])
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return self.columns[key]
+        if isinstance(key, slice):
+            return Schedule({col: column[key] for col, column in self.columns.items()})
+        return ScheduleRow(self, range(len(self))[key])
+
+    def __iter__(self):
+        return (ScheduleRow(self, index) for index in range(len(self)))
+
+    def __repr__(self):
+        return f"<Schedule {len(self)} rows, {self.nbytes} bytes>"
+
+    @property
+    def nbytes(self):
+        """Memory held by the column arrays, in bytes."""
+        return sum(column.nbytes for column in self.columns.values())
+
+    def chunks(self, size):
+        """Yields consecutive slices of at most size rows (views, no copies)."""
+        for start in range(0, len(self), size):
+            yield self[start:start + size]
+
+    def put(self, start, chunk):
+        """Copies the rows of another schedule in, starting at row start."""
+        for col in COLUMNS:
+            self.columns[col][start:start + len(chunk)] = chunk.columns[col]
+
+    def rows(self):
+        """
+        Yields plain (Inst.No, Principal, Interest, Total, Balance) tuples,
+        converting one column at a time rather than one cell at a time.
+        """
+        return zip(*(self.columns[col].tolist() for col in COLUMNS))
+
+
+class ScheduleRow:
+    """
+    Read-only view of one installment. Values are read from the schedule's
+    columns on access, so a row costs no more than its two slots.
+    """
+    __slots__ = ("schedule", "index")
+
+    def __init__(self, schedule, index):
+        self.schedule = schedule
+        self.index = index
+
+    def __getitem__(self, col):
+        return self.schedule.columns[col][self.index].item()
+
+    def __repr__(self):
+        return f"<ScheduleRow {self.values()}>"
+
+    def values(self):
+        """The row as an (Inst.No, Principal, Interest, Total, Balance) tuple."""
+        return tuple(self[col] for col in COLUMNS)
+
+
+def equal_principal_schedule(loan_amount, term_months, annual_rate):
+    """
+    Builds the equal-principal schedule in one vectorized pass.
+
+    Returns a Schedule whose columns are keyed by COLUMNS. Money columns
+    are rounded to 2 decimals, the same as the printed schedule.
+    """
+    return schedule_chunk(loan_amount, term_months, annual_rate, 0, term_months)
+
+
+def schedule_chunk(loan_amount, term_months, annual_rate, start, stop):
+    """
+    Builds installments start + 1 .. stop of the schedule as a Schedule,
+    without computing the ones before them.
+    """
+    principal_per_installment = loan_amount / term_months
+    monthly_rate = annual_rate / 100 / 12
+
+    installments = np.arange(start + 1, stop + 1, dtype=COLUMN_DTYPES["Inst.No"])
+    # Balances come straight from the installment number, so any slice can
+    # be built on its own; the clamp absorbs float noise on the last one.
+    balance = np.maximum(loan_amount - installments * principal_per_installment, 0.0)
+    opening_balance = np.maximum(loan_amount - (installments - 1) * principal_per_installment, 0.0)
+
+    interest = opening_balance * monthly_rate
+    total = principal_per_installment + interest
+
+    return Schedule({
+        "Inst.No": installments,
+        "Principal": np.full(len(installments), round(principal_per_installment, 2)),
+        "Interest": np.round(interest, 2),
+        "Total": np.round(total, 2),
+        "Balance": np.round(balance, 2),
+    })
+
+
+def reprice_schedule(schedule, loan_amount, term_months, annual_rate):
+    """
+    Recomputes a schedule for a new annual_rate. The schedule must have been
+    built for the same loan_amount and term_months.
+
+    Inst.No, Principal and Balance do not depend on the rate, so those
+    arrays are shared with the old schedule; only Interest and Total are
+    recomputed.
+    """
+    principal_per_installment = loan_amount / term_months
+    monthly_rate = annual_rate / 100 / 12
+
+    installments = schedule["Inst.No"]
+    opening_balance = np.maximum(loan_amount - (installments - 1) * principal_per_installment, 0.0)
+    interest = opening_balance * monthly_rate
+
+    return Schedule({
+        "Inst.No": installments,
+        "Principal": schedule["Principal"],
+        "Interest": np.round(interest, 2),
+        "Total": np.round(principal_per_installment + interest, 2),
+        "Balance": schedule["Balance"],
+    })
+
+
+def iter_schedule_chunks(loan_amount, term_months, annual_rate, chunk_size=4096):
+    """
+    Lazily yields the schedule as consecutive Schedule chunks of at most
+    chunk_size rows, so memory stays flat however long the term is.
+    """
+    for start in range(0, term_months, chunk_size):
+        yield schedule_chunk(
+            loan_amount, term_months, annual_rate, start, min(start + chunk_size, term_months)
+        )
+
+
+def iter_schedule(loan_amount, term_months, annual_rate, chunk_size=4096):
+    """
+    Lazily yields one (Inst.No, Principal, Interest, Total, Balance) tuple
+    per installment.
+    """
+    for chunk in iter_schedule_chunks(loan_amount, term_months, annual_rate, chunk_size):
+        yield from chunk.rows()
+
+
+def schedule_totals(schedule):
+    """
+    Sums the rounded Principal, Interest and Total columns of a schedule.
+    The sums are taken in integer paise, so they equal the sums of the
+    printed cells exactly rather than up to float error.
+    """
+    return tuple(paise_sum(schedule[col]) / 100 for col in ("Principal", "Interest", "Total"))
+
+
+def paise_sum(amounts):
+    """Exact sum of amounts already rounded to 2 decimals, in integer paise."""
+    return int(to_paise(amounts).sum())
+
+
+def to_paise(amounts):
+    """Rupee amounts as an int64 array of paise, to the nearest paisa."""
+    return np.rint(np.asarray(amounts, dtype=float) * 100).astype(np.int64)
+
+
+def divide_rounded(numerator, denominator, rounding=ROUND_HALF_UP):
+    """
+    numerator / denominator for non-negative int64 arrays, rounded to a whole
+    number by the given policy (one of ROUNDING_POLICIES) without floats.
+    """
+    quotient, remainder = np.divmod(numerator, denominator)
+    if rounding == ROUND_DOWN:
+        return quotient
+    twice = 2 * remainder
+    if rounding == ROUND_HALF_UP:
+        return quotient + (twice >= denominator)
+    if rounding == ROUND_HALF_EVEN:
+        return quotient + ((twice > denominator) | ((twice == denominator) & (quotient % 2 == 1)))
+    raise ValueError(f"Unknown rounding policy {rounding!r}; expected one of {ROUNDING_POLICIES}")
+
+
+def to_rate_units(annual_rates):
+    """Annual rates as an int64 array of RATE_SCALE units, to the nearest unit."""
+    return np.rint(np.asarray(annual_rates, dtype=float) * RATE_SCALE).astype(np.int64)
+
+
+def check_exact_range(loan_amounts, annual_rates):
+    """
+    Raises ValueError unless every loan can be worked out in int64 paise:
+    amount and rate finite, and each loan's paise times its rate units
+    (the largest interest numerator) below 2**63.
+    """
+    loan_amounts = np.asarray(loan_amounts, dtype=float)
+    annual_rates = np.asarray(annual_rates, dtype=float)
+    # Checked in float first: a value past int64 would wrap in the cast itself
+    if not (np.isfinite(loan_amounts).all() and np.isfinite(annual_rates).all()):
+        raise ValueError("Loan amount and rate must be finite for exact paise arithmetic.")
+    with np.errstate(over="ignore"):
+        too_large = (np.abs(loan_amounts).max(initial=0) * 100 >= 2 ** 63
+                     or np.abs(annual_rates).max(initial=0) * RATE_SCALE >= 2 ** 63)
+    if too_large:
+        raise ValueError("Loan amount and rate are too large for exact paise arithmetic.")
+
+    # The float product only picks out loans near the limit; those few are
+    # checked exactly with Python integers
+    loan_paise = np.abs(to_paise(loan_amounts)).ravel()
+    rate_units = np.abs(to_rate_units(annual_rates)).ravel()
+    near = np.flatnonzero(loan_paise.astype(float) * rate_units >= 2 ** 62)
+    if any(int(loan_paise[i]) * int(rate_units[i]) >= 2 ** 63 for i in near):
+        raise ValueError("Loan amount and rate are too large for exact paise arithmetic.")
+
+
+def exact_paise_columns(loan_amounts, term_months, annual_rates, start=0, stop=None,
+                        rounding=ROUND_HALF_UP):
+    """
+    Equal-principal schedules in exact integer paise, for one or many loans.
+
+    Returns a dict of 2-D int64 arrays keyed by COLUMNS, shaped (number of
+    loans, stop - start), for installments start + 1 .. stop (stop defaults
+    to the longest term). Rows past a loan's own term are zero, with an
+    "Inst.No" of 0, as in batch_equal_principal_schedules().
+
+    Each installment repays loan_paise // term_months; the last one also
+    repays the leftover loan_paise % term_months, so the principal column
+    sums to the loan amount exactly and the final balance is exactly 0.
+    Interest is rounded to the paisa by the rounding policy, and Total is
+    Principal + Interest, so every column total reconciles exactly.
+    """
+    check_exact_range(loan_amounts, annual_rates)
+    loan_paise = to_paise(loan_amounts).reshape(-1, 1)
+    term_months = np.asarray(term_months, dtype=np.int64).reshape(-1, 1)
+    rate_units = to_rate_units(annual_rates).reshape(-1, 1)
+
+    if stop is None:
+        stop = int(term_months.max(initial=0))
+    installments = np.arange(start + 1, stop + 1, dtype=np.int64)[None, :]
+    in_term = installments <= term_months
+    last = installments == term_months
+
+    principal = loan_paise // term_months
+    residual = loan_paise - principal * term_months
+    opening_balance = loan_paise - (installments - 1) * principal
+    balance = np.where(last, 0, loan_paise - installments * principal)
+    principal_paid = principal + np.where(last, residual, 0)
+    interest = divide_rounded(opening_balance * rate_units, 1200 * RATE_SCALE, rounding)
+
+    return {
+        "Inst.No": np.where(in_term, installments, 0),
+        "Principal": np.where(in_term, principal_paid, 0),
+        "Interest": np.where(in_term, interest, 0),
+        "Total": np.where(in_term, principal_paid + interest, 0),
+        "Balance": np.where(in_term, balance, 0),
+    }
+
+
+def exact_schedule_chunk(loan_amount, term_months, annual_rate, start, stop,
+                         rounding=ROUND_HALF_UP):
+    """
+    Installments start + 1 .. stop of the exact schedule as a Schedule. The
+    money columns hold paise / 100, which prints as the exact amount.
+    """
+    columns = exact_paise_columns(
+        [loan_amount], [term_months], [annual_rate], start, stop, rounding
+    )
+    return Schedule({
+        col: columns[col][0].astype(COLUMN_DTYPES[col]) if col == "Inst.No" else columns[col][0] / 100
+        for col in COLUMNS
+    })
+
+
+def exact_equal_principal_schedule(loan_amount, term_months, annual_rate, rounding=ROUND_HALF_UP):
+    """
+    Equal-principal schedule computed in integer paise; see exact_paise_columns().
+    """
+    return exact_schedule_chunk(loan_amount, term_months, annual_rate, 0, term_months, rounding)
+
+
+def iter_exact_schedule_chunks(loan_amount, term_months, annual_rate, chunk_size=4096,
+                               rounding=ROUND_HALF_UP):
+    """
+    Lazily yields the exact schedule as Schedule chunks of at most chunk_size rows.
+    """
+    for start in range(0, term_months, chunk_size):
+        yield exact_schedule_chunk(
+            loan_amount, term_months, annual_rate, start, min(start + chunk_size, term_months),
+            rounding,
+        )
+
+
+def equal_principal_totals(loan_amount, term_months, annual_rate):
+    """
+    Closed-form (principal, interest, payment) totals without building rows.
+
+    Interest is charged on a balance that falls linearly, so it sums to
+    loan_amount * monthly_rate * (term_months + 1) / 2. Works element-wise
+    on NumPy arrays as well as on scalars.
+    """
+    monthly_rate = annual_rate / 100 / 12
+    total_interest = loan_amount * monthly_rate * (term_months + 1) / 2
+    return loan_amount, total_interest, loan_amount + total_interest
+
+
+def batch_equal_principal_schedules(loan_amounts, term_months, annual_rates):
+    """
+    Builds equal-principal schedules for many loans at once.
+
+    Returns a dict of 2-D column arrays keyed by COLUMNS, shaped
+    (number of loans, longest term). Rows past a loan's own term are padded
+    with zeros, and their "Inst.No" is 0.
+    """
+    loan_amounts = np.asarray(loan_amounts, dtype=float)[:, None]
+    term_months = np.asarray(term_months, dtype=np.int64)[:, None]
+    monthly_rates = np.asarray(annual_rates, dtype=float)[:, None] / 100 / 12
+
+    installments = np.arange(1, int(term_months.max(initial=0)) + 1)[None, :]
+    in_term = installments <= term_months
+    principal_per_installment = loan_amounts / term_months
+
+    balance = np.maximum(loan_amounts - installments * principal_per_installment, 0.0)
+    opening_balance = np.maximum(loan_amounts - (installments - 1) * principal_per_installment, 0.0)
+    interest = opening_balance * monthly_rates
+    total = principal_per_installment + interest
+
+    return {
+        "Inst.No": np.where(in_term, installments, 0),
+        "Principal": np.where(in_term, np.round(principal_per_installment, 2), 0.0),
+        "Interest": np.where(in_term, np.round(interest, 2), 0.0),
+        "Total": np.where(in_term, np.round(total, 2), 0.0),
+        "Balance": np.where(in_term, np.round(balance, 2), 0.0),
+    }
@@ -0,0 +1,227 @@
+"""
+Streaming schedule writers. They consume schedule chunks (see
+loan_engine.iter_schedule_chunks and Schedule.chunks) one at a time, so
+memory does not grow with the number of rows.
+
+Every writer takes an optional progress(rows_written) callback, called
+after each chunk. Raising ExportCancelled from it stops the export.
+
+The schedule writers all end with a "Total" row of the principal, interest
+and payment sums unless totals_row is False.
+"""
+import functools
+import os
+
+import numpy as np
+
+from loan_engine import COLUMNS, paise_sum
+from loan_format import format_inr, format_inr_column
+from loan_store import LOAN_DTYPES, ROW_DTYPES, store_header
+
+CSV_FORMAT = ("%d", "%.2f", "%.2f", "%.2f", "%.2f")
+NDJSON_FORMAT = (
+    '{"Inst.No": %d, "Principal": %.2f, "Interest": %.2f, "Total": %.2f, "Balance": %.2f}'
+)
+
+PDF_COLUMN_WIDTH = 38   # mm; five columns fill an A4 page between 10 mm margins
+PDF_ROW_HEIGHT = 6      # mm
+
+
+class ExportCancelled(Exception):
+    """Raised by a progress callback to abandon an export."""
+
+
+def _stream(chunks, write_chunk, progress):
+    """
+    Passes each chunk to write_chunk, reports progress, and returns the
+    (principal, interest, total) sums. They are kept in integer paise, so
+    long schedules do not pick up float error.
+    """
+    rows = 0
+    total_principal = total_interest = total_payment = 0
+    for chunk in chunks:
+        write_chunk(chunk)
+        total_principal += paise_sum(chunk["Principal"])
+        total_interest += paise_sum(chunk["Interest"])
+        total_payment += paise_sum(chunk["Total"])
+        rows += len(chunk)
+        if progress is not None:
+            progress(rows)
+    return total_principal / 100, total_interest / 100, total_payment / 100
+
+
+def _savetxt_chunk(out, fmt):
+    def write_chunk(chunk):
+        np.savetxt(out, np.column_stack([chunk[col] for col in COLUMNS]), fmt=fmt, delimiter=",")
+    return write_chunk
+
+
+def write_csv(out, chunks, totals_row=True, progress=None):
+    """
+    Streams schedule chunks to the open file out as CSV with a header row.
+    Ends with a "Total" row unless totals_row is False. Returns the totals.
+    """
+    out.write(",".join(COLUMNS) + "\n")
+    totals = _stream(chunks, _savetxt_chunk(out, list(CSV_FORMAT)), progress)
+    if totals_row:
+        out.write("Total,%.2f,%.2f,%.2f,\n" % totals)
+    return totals
+
+
+def write_ndjson(out, chunks, totals_row=True, progress=None):
+    """
+    Streams schedule chunks to the open file out as one JSON object per line.
+    Ends with a {"Inst.No": "Total", ...} object unless totals_row is False.
+    Returns the totals.
+    """
+    totals = _stream(chunks, _savetxt_chunk(out, NDJSON_FORMAT), progress)
+    if totals_row:
+        out.write('{"Inst.No": "Total", "Principal": %.2f, "Interest": %.2f, "Total": %.2f}\n'
+                  % totals)
+    return totals
+
+
+def write_store(out, chunks, loan_amounts, term_months, annual_rates, rounding=None, progress=None):
+    """
+    Writes a binary schedule store (see loan_store.py) to out, a file open
+    for binary writing. The chunks must hold every loan's rows in order,
+    term_months rows per loan. The file is sized up front from the terms
+    and each chunk's columns are written straight into place. rounding is
+    recorded in the header. Returns the totals.
+    """
+    loan_amounts = np.atleast_1d(np.asarray(loan_amounts, dtype=float))
+    term_months = np.atleast_1d(np.asarray(term_months, dtype=np.int64))
+    annual_rates = np.atleast_1d(np.asarray(annual_rates, dtype=float))
+    offsets = np.concatenate([[0], np.cumsum(term_months)])
+    prefix, header = store_header(len(loan_amounts), int(offsets[-1]), rounding)
+    arrays = header["arrays"]
+
+    out.write(prefix)
+    for name, values in zip(LOAN_DTYPES, (loan_amounts, term_months, annual_rates, offsets)):
+        out.seek(arrays[name]["offset"])
+        out.write(values.astype(LOAN_DTYPES[name]).tobytes())
+    out.truncate(header["size"])
+
+    rows_written = 0
+
+    def write_chunk(chunk):
+        nonlocal rows_written
+        if rows_written + len(chunk) > header["rows"]:
+            raise ValueError("The schedules have more rows than the loan terms add up to.")
+        for col, dtype in ROW_DTYPES.items():
+            out.seek(arrays[col]["offset"] + rows_written * np.dtype(dtype).itemsize)
+            out.write(np.asarray(chunk[col], dtype=dtype).tobytes())
+        rows_written += len(chunk)
+
+    totals = _stream(chunks, write_chunk, progress)
+    if rows_written != header["rows"]:
+        raise ValueError("The schedules have fewer rows than the loan terms add up to.")
+    return totals
+
+
+def _remove_on_failure(save):
+    """
+    Deletes a half-written file if saving it fails or is cancelled.
+    """
+    @functools.wraps(save)
+    def wrapper(path, *args, **kwargs):
+        try:
+            return save(path, *args, **kwargs)
+        except BaseException:
+            if os.path.exists(path):
+                os.remove(path)
+            raise
+    return wrapper
+
+
+@_remove_on_failure
+def save_csv(path, chunks, totals_row=True, progress=None):
+    """Writes schedule chunks to a CSV file. See write_csv()."""
+    with open(path, "w", newline="") as out:
+        return write_csv(out, chunks, totals_row, progress)
+
+
+@_remove_on_failure
+def save_xlsx(path, chunks, totals_row=True, progress=None):
+    """
+    Writes schedule chunks to an Excel workbook using openpyxl's write-only
+    mode, which streams rows to disk instead of keeping a sheet in memory.
+    """
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Schedule")
+    sheet.append(COLUMNS)
+
+    def write_chunk(chunk):
+        for row in chunk.rows():
+            sheet.append(row)
+
+    try:
+        totals = _stream(chunks, write_chunk, progress)
+    except BaseException:
+        # Only workbook.save() would otherwise finish the sheet's row writer
+        # and remove the temp file openpyxl streams the rows into
+        sheet.close()
+        sheet._writer.cleanup()
+        raise
+    if totals_row:
+        sheet.append(("Total",) + totals)
+    workbook.save(path)
+    return totals
+
+
+@_remove_on_failure
+def save_pdf(path, chunks, title="Loan Amortization Schedule", totals_row=True, progress=None):
+    """
+    Writes schedule chunks as a paginated A4 PDF report. The column headings
+    are repeated on every page, and amounts are in Indian format.
+
+    fpdf2 keeps finished pages until the file is written. Only the current
+    chunk's formatted text is held at a time.
+    """
+    from fpdf import FPDF
+
+    pdf = FPDF(orientation="P", unit="mm", format="A4")
+    pdf.set_auto_page_break(False)
+    pdf.set_margins(10, 10, 10)
+    bottom = pdf.h - 15
+
+    def new_page():
+        pdf.add_page()
+        pdf.set_font("Helvetica", "B", 12)
+        pdf.cell(0, 8, title)
+        pdf.set_font("Helvetica", "", 8)
+        pdf.cell(0, 8, f"Page {pdf.page_no()}", align="R")
+        pdf.ln(10)
+        pdf.set_font("Helvetica", "B", 9)
+        for col in COLUMNS:
+            pdf.cell(PDF_COLUMN_WIDTH, PDF_ROW_HEIGHT, col, border=1, align="C")
+        pdf.ln(PDF_ROW_HEIGHT)
+
+    def write_row(values, style=""):
+        if pdf.get_y() + PDF_ROW_HEIGHT > bottom:
+            new_page()
+        pdf.set_font("Helvetica", style, 9)
+        for value in values:
+            pdf.cell(PDF_COLUMN_WIDTH, PDF_ROW_HEIGHT, value, border=1, align="R")
+        pdf.ln(PDF_ROW_HEIGHT)
+
+    def write_chunk(chunk):
+        formatted = [format_inr_column(chunk[col]) for col in COLUMNS[1:]]
+        for row in zip(map(str, chunk["Inst.No"].tolist()), *formatted):
+            write_row(row)
+
+    new_page()
+    totals = _stream(chunks, write_chunk, progress)
+    if totals_row:
+        write_row(("Total",) + tuple(format_inr(value) for value in totals) + ("",), style="B")
+    pdf.output(path)
+    return totals
+
+
+@_remove_on_failure
+def save_store(path, chunks, loan_amounts, term_months, annual_rates, rounding=None, progress=None):
+    """Writes schedule chunks to a binary schedule store. See write_store()."""
+    with open(path, "wb") as out:
+        return write_store(out, chunks, loan_amounts, term_months, annual_rates, rounding, progress)
@@ -0,0 +1,97 @@
+"""
+Indian-style (lakh/crore) number formatting shared by the CLI and GUI.
+"""
+import numpy as np
+
+# Largest amount format_inr_column() handles in int64 paise, with room to spare
+INT64_SAFE_RUPEES = 9e16
+
+
+def format_inr(amount):
+    """
+    Formats a number with commas in Indian style (e.g., 1,23,456.78).
+
+    The last three digits form one group and the rest are grouped in twos,
+    so a crore reads 1,00,00,000.00. Negative values keep their sign in
+    front.
+    """
+    s = f"{amount:.2f}"
+    sign = ""
+    if s[0] == "-":
+        s = s[1:]
+        # -0.004 rounds to "-0.00"; show it as plain zero
+        sign = "-" if s != "0.00" else ""
+
+    integer_part = s[:-3]
+    if len(integer_part) > 3:
+        rest = integer_part[:-3]
+        rest_with_commas = ""
+        while len(rest) > 2:
+            rest_with_commas = "," + rest[-2:] + rest_with_commas
+            rest = rest[:-2]
+        integer_part = rest + rest_with_commas + "," + integer_part[-3:]
+    return sign + integer_part + s[-3:]
+
+
+def format_inr_column(values):
+    """
+    Formats a whole column at once, returning a list of strings.
+
+    The lakh/crore groups are split out with integer arithmetic on the whole
+    array, then every value with the same sign and number of groups is
+    rendered with one %-template. A constant column (e.g. Principal) is
+    formatted once. Values are taken to the nearest paisa, so the output
+    matches format_inr() for amounts already rounded to 2 decimals.
+    """
+    values = np.asarray(values, dtype=float)
+    if len(values) == 0:
+        return []
+    if values.min() == values.max():
+        return [format_inr(values[0].item())] * len(values)
+
+    # Past about 2**63 paise (and for inf or nan) the int64 cast below would
+    # wrap, so those few values go through format_inr() instead
+    outside = ~(np.abs(values) < INT64_SAFE_RUPEES)
+    if outside.any():
+        formatted = np.empty(len(values), dtype=object)
+        formatted[outside] = [format_inr(value) for value in values[outside].tolist()]
+        inside = np.flatnonzero(~outside)
+        formatted[inside] = format_inr_column(values[inside])
+        return formatted.tolist()
+
+    paise = np.rint(np.abs(values) * 100).astype(np.int64)
+    rupees, fraction = np.divmod(paise, 100)
+    head, last_three = np.divmod(rupees, 1000)
+
+    # Number of two-digit groups between the leading group and the last three
+    pairs = np.zeros(len(values), dtype=np.int64)
+    lead = head.copy()
+    while True:
+        more = lead >= 100
+        if not more.any():
+            break
+        pairs += more
+        lead //= 100
+
+    negative = (values < 0) & (paise > 0)
+    kinds = (pairs * 2 + negative) * 2 + (head > 0)
+
+    formatted = np.empty(len(values), dtype=object)
+    for kind in np.unique(kinds).tolist():
+        rows = np.flatnonzero(kinds == kind)
+        has_head = kind % 2
+        sign = "-" if (kind // 2) % 2 else ""
+        count = kind // 4
+        if has_head:
+            template = sign + "%d" + ",%02d" * count + ",%03d.%02d"
+            groups = []
+            rest = head[rows]
+            for _ in range(count):
+                rest, pair = np.divmod(rest, 100)
+                groups.insert(0, pair)
+            args = [rest] + groups + [last_three[rows], fraction[rows]]
+        else:
+            template = sign + "%d.%02d"
+            args = [rupees[rows], fraction[rows]]
+        formatted[rows] = [template % row for row in zip(*(arg.tolist() for arg in args))]
+    return formatted.tolist()
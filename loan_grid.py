@@ -0,0 +1,144 @@
+"""
+Scenario sweeps: equal-principal figures for every combination of a range
+of loan amounts, terms and rates, computed in one broadcast pass.
+
+The figures all have closed forms, so no schedule is built. For a grid of
+A amounts, T terms and R rates every metric is an (A, T, R) array.
+"""
+import numpy as np
+
+from loan_engine import equal_principal_totals
+
+GRID_FIELDS = ("loan_amount", "term_months", "annual_rate")
+GRID_METRICS = ("total_interest", "first_installment", "last_installment", "total_payment")
+GRID_HEADER = GRID_FIELDS + GRID_METRICS
+GRID_FORMAT = ("%.2f", "%d", "%.10g", "%.2f", "%.2f", "%.2f", "%.2f")
+
+# Refuse grids that would not fit comfortably in memory (about 40 bytes a cell)
+MAX_GRID_CELLS = 50_000_000
+
+
+def parse_range(text, integer=False):
+    """
+    Parses a sweep range: "start:stop:step" (stop included), a list of
+    values separated by spaces or semicolons, or a single value. Commas are
+    taken as thousands separators, as in the amount prompt.
+    """
+    text = text.replace(",", "").strip()
+    if not text:
+        raise ValueError("Empty range.")
+    try:
+        if ":" in text:
+            start, stop, step = (float(part) for part in text.split(":"))
+            if not np.isfinite([start, stop, step]).all() or step <= 0 or stop < start:
+                raise ValueError
+            # The small allowance keeps stop itself despite float steps like 0.1;
+            # the count stays a float, as a tiny step can make it overflow
+            count = np.floor((stop - start) / step + 1e-9) + 1
+        else:
+            values = np.array([float(part) for part in text.replace(";", " ").split()])
+    except ValueError:
+        raise ValueError(f"Invalid range {text!r}; use start:stop:step or a list of values.")
+    if ":" in text:
+        # Counted before any allocation, so a huge range fails with a message
+        if not count <= MAX_GRID_CELLS:
+            size = f"{count:,.0f}" if np.isfinite(count) else "too many"
+            raise ValueError(
+                f"Range {text!r} has {size} values; the grid limit is {MAX_GRID_CELLS:,} cells."
+            )
+        values = start + step * np.arange(int(count))
+
+    if integer:
+        if not np.isfinite(values).all() or (values != np.round(values)).any():
+            raise ValueError(f"Range {text!r} must contain whole numbers.")
+        values = values.astype(np.int64)
+    return values
+
+
+def validate_axes(loan_amounts, term_months, annual_rates):
+    """
+    Checks the three ranges with the same rules as the prompts and returns
+    them as 1-D arrays. Raises ValueError.
+    """
+    loan_amounts = np.atleast_1d(np.asarray(loan_amounts, dtype=float))
+    term_months = np.atleast_1d(np.asarray(term_months, dtype=float))
+    annual_rates = np.atleast_1d(np.asarray(annual_rates, dtype=float))
+    if not (loan_amounts > 0).all() or not (term_months > 0).all() or not (annual_rates >= 0).all():
+        raise ValueError(
+            "Loan amounts and terms must be positive and interest rates non-negative."
+        )
+    # Checked before the terms are cast, where inf would wrap
+    if not all(np.isfinite(axis).all() for axis in (loan_amounts, term_months, annual_rates)):
+        raise ValueError("Loan amounts, terms and interest rates must be finite.")
+    term_months = term_months.astype(np.int64)
+    cells = len(loan_amounts) * len(term_months) * len(annual_rates)
+    if cells > MAX_GRID_CELLS:
+        raise ValueError(f"The grid would have {cells:,} cells; the limit is {MAX_GRID_CELLS:,}.")
+    return loan_amounts, term_months, annual_rates
+
+
+def sensitivity_grid(loan_amounts, term_months, annual_rates):
+    """
+    Every GRID_METRICS figure for every (amount, term, rate) combination.
+
+    Returns a dict of (amounts, terms, rates) arrays rounded to 2 decimals.
+    The first installment carries interest on the whole loan and the last
+    on one installment's worth of principal.
+    """
+    loan_amounts, term_months, annual_rates = validate_axes(loan_amounts, term_months, annual_rates)
+    amount = loan_amounts[:, None, None]
+    term = term_months[None, :, None]
+    rate = annual_rates[None, None, :]
+
+    _, total_interest, total_payment = equal_principal_totals(amount, term, rate)
+    principal = amount / term
+    monthly_rate = rate / 100 / 12
+    shape = (len(loan_amounts), len(term_months), len(annual_rates))
+    return {
+        "total_interest": np.round(np.broadcast_to(total_interest, shape), 2),
+        "first_installment": np.round(principal + amount * monthly_rate, 2),
+        "last_installment": np.round(np.broadcast_to(principal * (1 + monthly_rate), shape), 2),
+        "total_payment": np.round(np.broadcast_to(total_payment, shape), 2),
+    }
+
+
+def write_grid(out, loan_amounts, term_months, annual_rates):
+    """
+    Writes the grid to the open file out as CSV laid out as GRID_HEADER,
+    one row per cell. One loan amount is computed at a time, so memory is
+    bounded by terms x rates.
+    """
+    loan_amounts, term_months, annual_rates = validate_axes(loan_amounts, term_months, annual_rates)
+    out.write(",".join(GRID_HEADER) + "\n")
+    terms, rates = (axis.ravel() for axis in np.meshgrid(term_months, annual_rates, indexing="ij"))
+    for amount in loan_amounts:
+        grid = sensitivity_grid([amount], term_months, annual_rates)
+        rows = np.column_stack(
+            [np.full(len(terms), amount), terms, rates] + [grid[name].ravel() for name in GRID_METRICS]
+        )
+        np.savetxt(out, rows, fmt=list(GRID_FORMAT), delimiter=",")
+
+
+def heatmap_slice(grid, axes, metric):
+    """
+    Picks the 2-D view of a grid to draw as a heatmap. Term and rate are
+    preferred, but a range with more than one value beats a single value.
+    If all three are ranges, the first loan amount is shown.
+
+    Returns (values, (y_field, y_values), (x_field, x_values), fixed), with
+    values shaped (len(y_values), len(x_values)) and fixed naming the
+    field held constant and its value.
+    """
+    preference = (1, 2, 0)    # term, rate, amount
+    varying = [dim for dim in preference if len(axes[dim]) > 1]
+    shown = sorted((varying + [dim for dim in preference if dim not in varying])[:2])
+    fixed_dim = ({0, 1, 2} - set(shown)).pop()
+
+    values = np.take(grid[metric], 0, axis=fixed_dim)
+    y_dim, x_dim = shown
+    return (
+        values,
+        (GRID_FIELDS[y_dim], axes[y_dim]),
+        (GRID_FIELDS[x_dim], axes[x_dim]),
+        (GRID_FIELDS[fixed_dim], axes[fixed_dim][0]),
+    )
@@ -0,0 +1,362 @@
+"""
+Segment-based amortization for loans whose terms change over time.
+
+A loan is repaid either as a standard annuity (a fixed EMI) or with equal
+principal installments, and may have part-prepayments, floating-rate resets
+and moratoria, given as a list of events. Between two events the terms are
+fixed, so each stretch is one Segment whose balances and interest follow
+in closed form. Totals and the balance at any month therefore cost time
+proportional to the number of events, not the number of months, and rows
+are only built when schedule() asks for them.
+
+    loan = SegmentedLoan(5_000_000, 240, 8.5, ANNUITY, events=[
+        RateReset(12, 9.0),
+        Prepayment(24, 500_000),
+        Moratorium(36, 6),
+    ])
+    loan.totals()              # without building any rows
+    loan.balance_at(60)
+    loan.schedule(0, 12)       # the first year as a loan_engine.Schedule
+
+Event months are installment numbers: an event at month m takes effect
+after installment m, so RateReset(0, ...) changes the rate from the start.
+"""
+import bisect
+import math
+
+import numpy as np
+
+from loan_engine import COLUMN_DTYPES, Schedule
+
+ANNUITY = "annuity"
+EQUAL_PRINCIPAL = "equal_principal"
+
+# Segment kinds besides the two repayment methods
+CAPITALIZE = "capitalize"          # moratorium: nothing paid, interest added to the balance
+INTEREST_ONLY = "interest_only"    # moratorium: interest paid, balance unchanged
+
+REDUCE_EMI = "emi"
+REDUCE_TERM = "term"
+
+
+class Prepayment:
+    """
+    Part-prepayment of amount, paid together with installment month.
+
+    reduce picks what gives: REDUCE_EMI keeps the remaining term and lowers
+    the installment, REDUCE_TERM keeps the installment and ends the loan
+    earlier.
+    """
+    __slots__ = ("month", "amount", "reduce")
+
+    def __init__(self, month, amount, reduce=REDUCE_EMI):
+        if month < 1:
+            raise ValueError("A prepayment is paid with an installment, so its month must be 1 or later.")
+        if amount <= 0:
+            raise ValueError("A prepayment amount must be positive.")
+        if reduce not in (REDUCE_EMI, REDUCE_TERM):
+            raise ValueError(f"reduce must be {REDUCE_EMI!r} or {REDUCE_TERM!r}")
+        self.month = month
+        self.amount = amount
+        self.reduce = reduce
+
+    def __repr__(self):
+        return f"Prepayment({self.month}, {self.amount}, reduce={self.reduce!r})"
+
+
+class RateReset:
+    """
+    Floating-rate reset to annual_rate from installment month + 1 onwards.
+    The remaining term is kept and the installment recomputed.
+    """
+    __slots__ = ("month", "annual_rate")
+
+    def __init__(self, month, annual_rate):
+        if annual_rate < 0:
+            raise ValueError("The interest rate must be non-negative.")
+        self.month = month
+        self.annual_rate = annual_rate
+
+    def __repr__(self):
+        return f"RateReset({self.month}, {self.annual_rate})"
+
+
+class Moratorium:
+    """
+    Repayment holiday for installments month + 1 .. month + months. The
+    maturity moves out by the same number of months. Interest is added to
+    the balance, or paid as it falls due if interest_only is set.
+    """
+    __slots__ = ("month", "months", "interest_only")
+
+    def __init__(self, month, months, interest_only=False):
+        if months <= 0:
+            raise ValueError("A moratorium must last at least one month.")
+        self.month = month
+        self.months = months
+        self.interest_only = interest_only
+
+    def __repr__(self):
+        return f"Moratorium({self.month}, {self.months}, interest_only={self.interest_only})"
+
+
+class Segment:
+    """
+    Installments start + 1 .. stop, repaid under fixed terms: an opening
+    balance, a monthly rate and a kind. amount is the EMI for ANNUITY and
+    the principal per installment for EQUAL_PRINCIPAL.
+    """
+    __slots__ = ("start", "stop", "opening_balance", "monthly_rate", "kind", "amount")
+
+    def __init__(self, start, stop, opening_balance, monthly_rate, kind, amount=0.0):
+        self.start = start
+        self.stop = stop
+        self.opening_balance = opening_balance
+        self.monthly_rate = monthly_rate
+        self.kind = kind
+        self.amount = amount
+
+    def __len__(self):
+        return self.stop - self.start
+
+    def __repr__(self):
+        return (f"<Segment {self.start + 1}..{self.stop} {self.kind} "
+                f"balance={self.opening_balance:.2f} rate={self.monthly_rate:.6f}>")
+
+    def balance_after(self, k):
+        """
+        Balance after the segment's first k installments; k may be an array.
+        The final installment of a loan may overpay, so it is clamped at 0.
+        """
+        b0, r, a = self.opening_balance, self.monthly_rate, self.amount
+        k = np.asarray(k, dtype=float)
+        if self.kind == ANNUITY:
+            if r == 0:
+                balance = b0 - a * k
+            else:
+                balance = b0 + np.expm1(k * np.log1p(r)) * (b0 * r - a) / r
+        elif self.kind == EQUAL_PRINCIPAL:
+            balance = b0 - a * k
+        elif self.kind == CAPITALIZE:
+            balance = b0 * np.exp(k * np.log1p(r))
+        else:
+            balance = np.full(k.shape, b0)
+        return np.maximum(balance, 0.0)
+
+    def closing_balance(self):
+        return float(self.balance_after(len(self)))
+
+    def interest(self):
+        """
+        Interest over the whole segment: monthly_rate times the sum of the
+        opening balances, which is a geometric or arithmetic series.
+        """
+        b0, r, a, n = self.opening_balance, self.monthly_rate, self.amount, len(self)
+        if self.kind == ANNUITY:
+            if r == 0:
+                return 0.0
+            return n * a + math.expm1(n * math.log1p(r)) * (b0 * r - a) / r
+        if self.kind == EQUAL_PRINCIPAL:
+            return r * (n * b0 - a * n * (n - 1) / 2)
+        if self.kind == CAPITALIZE:
+            return b0 * math.expm1(n * math.log1p(r))
+        return n * b0 * r
+
+    def columns(self, first, last):
+        """
+        Unrounded Inst.No, Principal, Interest, Total and Balance arrays for
+        installments first + 1 .. last, which must lie within the segment.
+        """
+        k = np.arange(first - self.start + 1, last - self.start + 1)
+        opening = self.balance_after(k - 1)
+        closing = self.balance_after(k)
+        interest = opening * self.monthly_rate
+        principal = opening - closing   # negative while interest is capitalized
+        return {
+            "Inst.No": k + self.start,
+            "Principal": principal,
+            "Interest": interest,
+            "Total": principal + interest,
+            "Balance": closing,
+        }
+
+
+def installment_amount(balance, monthly_rate, months, method):
+    """
+    EMI (ANNUITY) or principal per installment (EQUAL_PRINCIPAL) that repays
+    balance over months.
+    """
+    if method == EQUAL_PRINCIPAL or monthly_rate == 0:
+        return balance / months
+    return balance * monthly_rate / -math.expm1(-months * math.log1p(monthly_rate))
+
+
+def months_to_repay(balance, monthly_rate, amount, method):
+    """
+    Installments needed to repay balance at a fixed EMI or principal per
+    installment; the last one may be smaller.
+    """
+    if method == EQUAL_PRINCIPAL or monthly_rate == 0:
+        months = balance / amount
+    else:
+        months = -math.log1p(-balance * monthly_rate / amount) / math.log1p(monthly_rate)
+    # Shave float noise so that an exact whole number is not rounded up
+    return max(1, math.ceil(months - 1e-9))
+
+
+class SegmentedLoan:
+    """
+    A loan split into Segments at its events. See the module docstring.
+
+    segments lists the Segments in order, covering installments 1 .. len(loan)
+    without gaps. prepayments maps an installment number to the amount
+    prepaid with it.
+    """
+
+    def __init__(self, loan_amount, term_months, annual_rate, method=ANNUITY, events=()):
+        if method not in (ANNUITY, EQUAL_PRINCIPAL):
+            raise ValueError(f"method must be {ANNUITY!r} or {EQUAL_PRINCIPAL!r}")
+        if loan_amount <= 0 or term_months <= 0 or annual_rate < 0:
+            raise ValueError(
+                "Loan amount and term must be positive and the interest rate non-negative."
+            )
+        self.loan_amount = float(loan_amount)
+        self.term_months = int(term_months)
+        self.annual_rate = annual_rate
+        self.method = method
+        self.events = sorted(events, key=lambda event: event.month)
+        self.segments = []
+        self.prepayments = {}
+        self._split()
+        self._stops = [segment.stop for segment in self.segments]
+
+    def __len__(self):
+        return self._stops[-1] if self._stops else 0
+
+    def __repr__(self):
+        return f"<SegmentedLoan {self.method} {len(self)} installments, {len(self.segments)} segments>"
+
+    def _split(self):
+        # Walks from event to event, closing a Segment at each one. Only the
+        # running balance, rate, term and installment amount are carried.
+        balance = self.loan_amount
+        monthly_rate = self.annual_rate / 100 / 12
+        remaining = self.term_months
+        amount = installment_amount(balance, monthly_rate, remaining, self.method)
+        month = 0
+        moratorium_end = 0
+        moratorium_kind = CAPITALIZE
+        events = self.events
+        next_event = 0
+
+        while balance > 0 and (remaining > 0 or month < moratorium_end):
+            in_moratorium = month < moratorium_end
+            stop = moratorium_end if in_moratorium else month + remaining
+            if next_event < len(events):
+                stop = min(stop, max(events[next_event].month, month))
+
+            if stop > month:
+                if in_moratorium:
+                    segment = Segment(month, stop, balance, monthly_rate, moratorium_kind)
+                else:
+                    segment = Segment(month, stop, balance, monthly_rate, self.method, amount)
+                    remaining -= stop - month
+                self.segments.append(segment)
+                # The final installment pays off whatever float noise is left
+                balance = segment.closing_balance() if remaining > 0 or in_moratorium else 0.0
+                month = stop
+                if in_moratorium and month == moratorium_end and remaining > 0:
+                    amount = installment_amount(balance, monthly_rate, remaining, self.method)
+
+            # Apply every event due by now, in the order given
+            while next_event < len(events) and events[next_event].month <= month:
+                event = events[next_event]
+                next_event += 1
+                in_moratorium = month < moratorium_end
+                if isinstance(event, RateReset):
+                    monthly_rate = event.annual_rate / 100 / 12
+                    if not in_moratorium and remaining > 0:
+                        amount = installment_amount(balance, monthly_rate, remaining, self.method)
+                elif isinstance(event, Prepayment):
+                    if month == 0 or balance <= 0:
+                        continue
+                    paid = min(event.amount, balance)
+                    balance -= paid
+                    self.prepayments[month] = self.prepayments.get(month, 0.0) + paid
+                    if balance <= 0 or in_moratorium or remaining <= 0:
+                        continue
+                    if event.reduce == REDUCE_TERM:
+                        remaining = months_to_repay(balance, monthly_rate, amount, self.method)
+                    else:
+                        amount = installment_amount(balance, monthly_rate, remaining, self.method)
+                elif isinstance(event, Moratorium):
+                    moratorium_end = max(moratorium_end, month + event.months)
+                    moratorium_kind = INTEREST_ONLY if event.interest_only else CAPITALIZE
+                else:
+                    raise TypeError(f"Unknown loan event: {event!r}")
+
+    def balance_at(self, month):
+        """Outstanding balance after installment month (and any prepayment with it)."""
+        if month <= 0:
+            return self.loan_amount
+        index = bisect.bisect_left(self._stops, month)
+        if index == len(self.segments):
+            return 0.0
+        segment = self.segments[index]
+        balance = float(segment.balance_after(month - segment.start))
+        return max(balance - self.prepayments.get(month, 0.0), 0.0)
+
+    def totals(self):
+        """
+        Closed-form (principal, interest, payment) totals, unrounded, summed
+        segment by segment. Principal includes prepayments.
+        """
+        principal = sum(self.prepayments.values())
+        interest = 0.0
+        for segment in self.segments:
+            principal += segment.opening_balance - segment.closing_balance()
+            interest += segment.interest()
+        return principal, interest, principal + interest
+
+    def schedule(self, start=0, stop=None):
+        """
+        Builds installments start + 1 .. stop as a loan_engine.Schedule with
+        money rounded to 2 decimals. Only the segments in range are touched.
+        """
+        stop = len(self) if stop is None else min(stop, len(self))
+        start = max(0, min(start, stop))
+        parts = []
+        for index in range(bisect.bisect_right(self._stops, start), len(self.segments)):
+            segment = self.segments[index]
+            if segment.start >= stop:
+                break
+            parts.append(segment.columns(max(start, segment.start), min(stop, segment.stop)))
+
+        columns = {
+            col: np.concatenate([part[col] for part in parts]) if parts else np.empty(0)
+            for col in COLUMN_DTYPES
+        }
+        # A prepayment goes out with its installment and comes off that row's balance
+        for month, paid in self.prepayments.items():
+            if start < month <= stop:
+                row = month - start - 1
+                columns["Principal"][row] += paid
+                columns["Total"][row] += paid
+                columns["Balance"][row] = max(columns["Balance"][row] - paid, 0.0)
+
+        return Schedule({
+            col: column.astype(COLUMN_DTYPES[col]) if col == "Inst.No" else np.round(column, 2)
+            for col, column in columns.items()
+        })
+
+    def iter_chunks(self, chunk_size=4096):
+        """Lazily yields the schedule as Schedule chunks of at most chunk_size rows."""
+        for start in range(0, len(self), chunk_size):
+            yield self.schedule(start, start + chunk_size)
+
+
+def annuity_schedule(loan_amount, term_months, annual_rate):
+    """
+    Standard fixed-EMI schedule with no events, as a loan_engine.Schedule.
+    """
+    return SegmentedLoan(loan_amount, term_months, annual_rate, ANNUITY).schedule()
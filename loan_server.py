@@ -0,0 +1,415 @@
+"""
+Embeddable asyncio HTTP/JSON quote service, using only the standard
+library and NumPy.
+
+    POST /quote     {"loan_amount": 500000, "term_months": 60, "annual_rate": 9.5}
+                    add "schedule": true for the full installment table
+    POST /quotes    {"loans": [{...}, {...}]}
+    GET  /metrics   request count, p50/p99 latency and throughput
+    GET  /health
+
+Quotes that arrive together are micro-batched: every request parsed in the
+same event-loop turn (or within max_delay seconds) joins one vectorized
+loan_batch.loan_totals() call, which runs on an executor so the loop keeps
+accepting connections. Connections are kept alive, so a client pays the
+TCP handshake once rather than per quote.
+"""
+import asyncio
+import json
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+
+from loan_batch import FIELDS, TOTALS_HEADER, loan_totals, validate_loans
+from loan_engine import (
+    COLUMNS, check_exact_range, equal_principal_schedule, exact_equal_principal_schedule,
+    exact_paise_columns,
+)
+
+QUOTE_FIELDS = TOTALS_HEADER + ("first_installment",)
+
+MAX_BODY_BYTES = 16 * 1024 * 1024
+MAX_LOANS = 10_000          # loans in one /quotes request
+MAX_TERM_MONTHS = 1200      # 100 years; schedules and exact totals are built row by row
+EXACT_CHUNK_LOANS = 256     # loans priced per block in exact mode, which builds their rows
+METRICS_WINDOW = 100_000    # latencies kept for the percentiles
+THROUGHPUT_SECONDS = 10     # throughput is averaged over this many recent seconds
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+class HTTPError(Exception):
+    """Turned into a JSON error response with the given status."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def quote_rows(loan_amounts, term_months, annual_rates, rounding=None):
+    """
+    Executor task: one row per loan laid out as QUOTE_FIELDS. The first
+    installment is the largest one of an equal-principal loan. Exact totals
+    need every row, so exact batches are priced EXACT_CHUNK_LOANS at a time.
+    """
+    if rounding is not None and len(loan_amounts) > EXACT_CHUNK_LOANS:
+        return np.concatenate([
+            quote_rows(loan_amounts[start:start + EXACT_CHUNK_LOANS],
+                       term_months[start:start + EXACT_CHUNK_LOANS],
+                       annual_rates[start:start + EXACT_CHUNK_LOANS], rounding)
+            for start in range(0, len(loan_amounts), EXACT_CHUNK_LOANS)
+        ])
+    if rounding is None:
+        # Huge loans overflow to inf here; QuoteServer refuses such rows
+        with np.errstate(over="ignore", invalid="ignore"):
+            totals = loan_totals(loan_amounts, term_months, annual_rates)
+            first = np.round(loan_amounts / term_months + loan_amounts * annual_rates / 1200, 2)
+    else:
+        totals = loan_totals(loan_amounts, term_months, annual_rates, rounding)
+        first = exact_paise_columns(loan_amounts, term_months, annual_rates, 0, 1, rounding)["Total"][:, 0] / 100
+    return np.column_stack([totals, first])
+
+
+def schedule_table(loan_amount, term_months, annual_rate, rounding=None):
+    """Executor task: the full schedule as a list of row lists."""
+    if rounding is None:
+        schedule = equal_principal_schedule(loan_amount, term_months, annual_rate)
+    else:
+        schedule = exact_equal_principal_schedule(loan_amount, term_months, annual_rate, rounding)
+    return [list(row) for row in schedule.rows()]
+
+
+def parse_loans(items, rounding=None):
+    """
+    Validates a list of {"loan_amount", "term_months", "annual_rate"}
+    objects. Returns them as three arrays; raises HTTPError 400, or 413
+    for more than MAX_LOANS loans. With a rounding policy, loans too large
+    for exact paise arithmetic are refused here, before they can join (and
+    fail) a batch shared with other requests.
+    """
+    if len(items) > MAX_LOANS:
+        raise HTTPError(413, f"at most {MAX_LOANS} loans per request")
+    try:
+        columns = [[float(item[name]) for item in items] for name in FIELDS]
+        loan_amounts, term_months, annual_rates = validate_loans(*columns)
+    except (KeyError, TypeError, ValueError) as exc:
+        message = f"missing field {exc}" if isinstance(exc, KeyError) else str(exc)
+        raise HTTPError(400, message)
+    if (term_months > MAX_TERM_MONTHS).any():
+        raise HTTPError(400, f"term_months must be at most {MAX_TERM_MONTHS}")
+    if rounding is not None:
+        try:
+            check_exact_range(loan_amounts, annual_rates)
+        except ValueError as exc:
+            raise HTTPError(400, str(exc))
+    return loan_amounts, term_months, annual_rates
+
+
+class LatencyMetrics:
+    """
+    Latencies of the most recent METRICS_WINDOW requests, with their
+    completion times for the throughput figure.
+    """
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.requests = 0
+        self.errors = 0
+        self.batches = 0
+        self.batched_loans = 0
+        self.latencies = deque(maxlen=METRICS_WINDOW)
+        self.finished = deque(maxlen=METRICS_WINDOW)
+
+    def record(self, seconds, error=False):
+        self.requests += 1
+        self.errors += error
+        self.latencies.append(seconds)
+        self.finished.append(time.monotonic())
+
+    def snapshot(self):
+        now = time.monotonic()
+        uptime = now - self.started
+        window = min(THROUGHPUT_SECONDS, uptime) or 1.0
+        recent = len(self.finished) - np.searchsorted(np.asarray(self.finished), now - window)
+        if self.latencies:
+            p50, p99 = np.percentile(np.asarray(self.latencies), [50, 99]) * 1000
+        else:
+            p50 = p99 = 0.0
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "p50_ms": round(float(p50), 3),
+            "p99_ms": round(float(p99), 3),
+            "throughput_rps": round(float(recent) / window, 1),
+            "batches": self.batches,
+            "mean_batch_loans": round(self.batched_loans / self.batches, 2) if self.batches else 0.0,
+            "uptime_s": round(uptime, 1),
+        }
+
+
+class QuoteBatcher:
+    """
+    Collects the loans of concurrent requests and prices them in one
+    quote_rows() call on the executor. A batch goes out after max_delay
+    seconds (0: at the end of the current loop turn) or as soon as it
+    holds max_batch loans.
+    """
+
+    def __init__(self, executor, metrics, max_batch=4096, max_delay=0.0, rounding=None):
+        self.executor = executor
+        self.metrics = metrics
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.rounding = rounding
+        self.pending = []   # (loan_amounts, term_months, annual_rates, future)
+        self.pending_loans = 0
+        self.flush_handle = None
+
+    async def quote(self, loan_amounts, term_months, annual_rates):
+        """Awaits the QUOTE_FIELDS rows for these loans."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.pending.append((loan_amounts, term_months, annual_rates, future))
+        self.pending_loans += len(loan_amounts)
+        if self.pending_loans >= self.max_batch:
+            self.flush()
+        elif self.flush_handle is None:
+            if self.max_delay > 0:
+                self.flush_handle = loop.call_later(self.max_delay, self.flush)
+            else:
+                self.flush_handle = loop.call_soon(self.flush)
+        return await future
+
+    def flush(self):
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+        batch, self.pending, self.pending_loans = self.pending, [], 0
+        if not batch:
+            return
+        self.metrics.batches += 1
+        self.metrics.batched_loans += sum(len(item[0]) for item in batch)
+
+        columns = [np.concatenate([item[index] for item in batch]) for index in range(3)]
+        task = asyncio.get_running_loop().run_in_executor(
+            self.executor, quote_rows, *columns, self.rounding
+        )
+        task.add_done_callback(lambda done: self._deliver(batch, done))
+
+    def _deliver(self, batch, done):
+        # Hand each request its own slice of the batch's rows
+        if done.cancelled():
+            for *_, future in batch:
+                future.cancel()
+            return
+        if done.exception() is not None:
+            if len(batch) == 1:
+                _, _, _, future = batch[0]
+                if not future.done():
+                    future.set_exception(done.exception())
+                return
+            # Price each request on its own, so a failure only reaches
+            # the request that caused it
+            loop = asyncio.get_running_loop()
+            for item in batch:
+                task = loop.run_in_executor(self.executor, quote_rows, *item[:3], self.rounding)
+                task.add_done_callback(lambda done, item=item: self._deliver([item], done))
+            return
+        rows = done.result()
+        start = 0
+        for loan_amounts, _, _, future in batch:
+            stop = start + len(loan_amounts)
+            if not future.done():
+                future.set_result(rows[start:stop])
+            start = stop
+
+
+class QuoteServer:
+    """
+    The HTTP front end. Use start() and close() to embed it in a running
+    event loop, or run() to serve until interrupted. workers sizes the
+    offload pool, a thread pool unless processes is set.
+    """
+
+    def __init__(self, host="127.0.0.1", port=8080, workers=2, processes=False,
+                 max_batch=4096, max_delay=0.0, rounding=None):
+        self.host = host
+        self.port = port
+        self.rounding = rounding
+        pool = ProcessPoolExecutor if processes else ThreadPoolExecutor
+        self.executor = pool(max_workers=workers)
+        self.metrics = LatencyMetrics()
+        self.batcher = QuoteBatcher(self.executor, self.metrics, max_batch, max_delay, rounding)
+        self.server = None
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle, self.host, self.port)
+        # Port 0 picks a free port; report the real one
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def run(self):
+        """Serves until Ctrl+C."""
+        async def serve():
+            await self.start()
+            print(f"Serving loan quotes on http://{self.host}:{self.port}", flush=True)
+            try:
+                await self.server.serve_forever()
+            finally:
+                await self.close()
+
+        try:
+            asyncio.run(serve())
+        except KeyboardInterrupt:
+            pass
+
+    async def handle(self, reader, writer):
+        # One connection; requests are served in order until it closes
+        try:
+            while True:
+                headers = {}
+                try:
+                    request_line = await reader.readline()
+                    if not request_line.strip():
+                        break
+                    started = time.perf_counter()
+                    while True:
+                        line = await reader.readline()
+                        if line in (b"\r\n", b"\n", b""):
+                            break
+                        name, _, value = line.decode("latin-1").partition(":")
+                        headers[name.strip().lower()] = value.strip()
+                except ValueError:
+                    # readline() refuses a line over the stream limit (64 KiB)
+                    request_line, headers, started = None, None, time.perf_counter()
+
+                keep_alive = headers is not None and headers.get("connection", "").lower() != "close"
+                path = None
+                try:
+                    if headers is None:
+                        raise HTTPError(400, "request line or header too long")
+                    parts = request_line.decode("latin-1").split()
+                    if len(parts) != 3:
+                        keep_alive = False
+                        raise HTTPError(400, "malformed request line")
+                    method, path, version = parts
+                    keep_alive = keep_alive and version == "HTTP/1.1"
+                    try:
+                        length = int(headers.get("content-length") or 0)
+                    except ValueError:
+                        length = -1
+                    if length < 0:
+                        # The body cannot be skipped without its length
+                        keep_alive = False
+                        raise HTTPError(400, "invalid Content-Length")
+                    if length > MAX_BODY_BYTES:
+                        keep_alive = False
+                        raise HTTPError(413, f"request body over {MAX_BODY_BYTES} bytes")
+                    body = await reader.readexactly(length) if length else b""
+                    payload = await self.dispatch(method, path.split("?")[0], body)
+                    status, response = 200, self.encode(payload)
+                except HTTPError as exc:
+                    status, response = exc.status, self.encode({"error": str(exc)})
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    raise
+                except Exception as exc:
+                    status, response = 500, self.encode({"error": str(exc)})
+
+                self.respond(writer, status, response, keep_alive)
+                await writer.drain()
+                if path in ("/quote", "/quotes"):
+                    self.metrics.record(time.perf_counter() - started, error=status != 200)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    def encode(payload):
+        # Strict JSON: NaN and Infinity raise ValueError instead of going out
+        return json.dumps(payload, separators=(",", ":"), allow_nan=False).encode()
+
+    def respond(self, writer, status, body, keep_alive):
+        writer.write(
+            f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+            "Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("latin-1") + body
+        )
+
+    async def dispatch(self, method, path, body):
+        routes = {
+            "/quote": ("POST", self.quote),
+            "/quotes": ("POST", self.quotes),
+            "/metrics": ("GET", self.metrics_payload),
+            "/health": ("GET", self.health),
+        }
+        if path not in routes:
+            raise HTTPError(404, f"no such endpoint: {path}")
+        allowed, handler = routes[path]
+        if method != allowed:
+            raise HTTPError(405, f"{path} expects {allowed}")
+        if method == "GET":
+            return await handler()
+        try:
+            request = json.loads(body)
+        except ValueError as exc:
+            raise HTTPError(400, f"invalid JSON: {exc}")
+        return await handler(request)
+
+    async def quote(self, request):
+        if not isinstance(request, dict):
+            raise HTTPError(400, "expected a JSON object")
+        loan_amounts, term_months, annual_rates = parse_loans([request], self.rounding)
+        rows = self.check_finite(await self.batcher.quote(loan_amounts, term_months, annual_rates))
+        result = self.quote_dict(rows[0])
+        if request.get("schedule"):
+            result["columns"] = COLUMNS
+            result["rows"] = await asyncio.get_running_loop().run_in_executor(
+                self.executor, schedule_table,
+                float(loan_amounts[0]), int(term_months[0]), float(annual_rates[0]), self.rounding,
+            )
+        return result
+
+    async def quotes(self, request):
+        loans = request.get("loans") if isinstance(request, dict) else None
+        if not isinstance(loans, list):
+            raise HTTPError(400, 'expected {"loans": [...]}')
+        if not loans:
+            return {"quotes": []}
+        rows = self.check_finite(await self.batcher.quote(*parse_loans(loans, self.rounding)))
+        return {"quotes": [self.quote_dict(row) for row in rows]}
+
+    async def metrics_payload(self):
+        return self.metrics.snapshot()
+
+    async def health(self):
+        return {"status": "ok"}
+
+    @staticmethod
+    def check_finite(rows):
+        # Float quotes of huge loans overflow to inf, which JSON cannot carry
+        if not np.isfinite(rows).all():
+            row = int(np.argmax(~np.isfinite(rows).all(axis=1)))
+            raise HTTPError(400, f"loan {row + 1} is too large to quote")
+        return rows
+
+    @staticmethod
+    def quote_dict(row):
+        quote = dict(zip(QUOTE_FIELDS, row.tolist()))
+        quote["term_months"] = int(quote["term_months"])
+        for name in QUOTE_FIELDS[3:]:
+            quote[name] = round(quote[name], 2)
+        return quote
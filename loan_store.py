@@ -0,0 +1,149 @@
+"""
+Binary schedule store: many loans' schedules in one file that can be
+memory-mapped and read a loan, a row or a column slice at a time.
+
+Layout (all numbers little-endian):
+
+    magic, version (2 bytes), header length (uint32), JSON header
+    loan_amount, term_months, annual_rate    one entry per loan
+    offsets                                  loans + 1 row offsets
+    Inst.No, Principal, Interest, Total, Balance
+                                             every loan's rows, one loan after another
+
+The JSON header gives each array's dtype, byte offset and length, so the
+file is a set of raw NPY-style columns. Loan j's rows are
+offsets[j]:offsets[j + 1] in every column, and each array starts on a
+STORE_ALIGNMENT boundary so it can be viewed without copying.
+
+Only NumPy is needed. Use loan_export.save_store() to write a store.
+"""
+import json
+import struct
+
+import numpy as np
+
+from loan_engine import COLUMNS, Schedule
+
+STORE_MAGIC = b"\x93LOANSTORE"
+STORE_VERSION = (1, 0)
+STORE_ALIGNMENT = 64
+STORE_SUFFIX = ".lstore"
+
+LOAN_DTYPES = {"loan_amount": "<f8", "term_months": "<i8", "annual_rate": "<f8", "offsets": "<i8"}
+ROW_DTYPES = {col: "<i4" if col == "Inst.No" else "<f8" for col in COLUMNS}
+
+_PREFIX = struct.Struct("<BBI")     # version major, minor, header length
+
+
+def _aligned(offset):
+    return -(-offset // STORE_ALIGNMENT) * STORE_ALIGNMENT
+
+
+def store_header(loan_count, row_count, rounding=None):
+    """
+    The bytes that start a store of loan_count loans and row_count rows,
+    padded to where the first array begins, and the header dict they
+    encode. header["arrays"] maps each array to its dtype, offset and
+    length; header["size"] is the size of the whole file.
+    """
+    lengths = {name: loan_count for name in LOAN_DTYPES}
+    lengths["offsets"] = loan_count + 1
+    lengths.update({col: row_count for col in ROW_DTYPES})
+    dtypes = {**LOAN_DTYPES, **ROW_DTYPES}
+
+    def encode(header):
+        text = json.dumps(header, separators=(",", ":")).encode("ascii")
+        return STORE_MAGIC + _PREFIX.pack(*STORE_VERSION, len(text)) + text
+
+    # The offsets depend on the header's own length, so lay the arrays out
+    # after an estimate of it and try again until the header fits
+    data_start = 0
+    while True:
+        offset = data_start
+        arrays = {}
+        for name, dtype in dtypes.items():
+            arrays[name] = {"dtype": dtype, "offset": offset, "length": lengths[name]}
+            offset = _aligned(offset + np.dtype(dtype).itemsize * lengths[name])
+        header = {"loans": loan_count, "rows": row_count, "rounding": rounding,
+                  "arrays": arrays, "size": offset}
+        prefix = encode(header)
+        if len(prefix) <= data_start:
+            return prefix.ljust(data_start, b" "), header
+        data_start = _aligned(len(prefix) + 32)
+
+
+def read_header(path):
+    """Reads and checks a store's header dict. Raises ValueError."""
+    with open(path, "rb") as f:
+        start = f.read(len(STORE_MAGIC) + _PREFIX.size)
+        if len(start) < len(STORE_MAGIC) + _PREFIX.size or not start.startswith(STORE_MAGIC):
+            raise ValueError(f"{path} is not a schedule store")
+        major, _, length = _PREFIX.unpack_from(start, len(STORE_MAGIC))
+        if major != STORE_VERSION[0]:
+            raise ValueError(f"{path}: unsupported schedule store version {major}")
+        header = json.loads(f.read(length))
+    return header
+
+
+class ScheduleStore:
+    """
+    A store file opened as a read-only memory map. Nothing is read until it
+    is used, so opening a multi-GB store is instant and fetching one loan
+    only touches that loan's pages.
+
+    store.schedule(j) is loan j's Schedule (0-based; its columns are views
+    of the file), store.schedule(j)[i] its installment i + 1, and
+    store.columns["Interest"][a:b] a slice across all loans' rows.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        header = read_header(path)
+        self.rounding = header["rounding"]
+        self.map = np.memmap(path, dtype=np.uint8, mode="r")
+        if len(self.map) < header["size"]:
+            raise ValueError(f"{path} is truncated")
+
+        arrays = {}
+        for name, spec in header["arrays"].items():
+            dtype = np.dtype(spec["dtype"])
+            start = spec["offset"]
+            arrays[name] = self.map[start:start + dtype.itemsize * spec["length"]].view(dtype)
+        self.loan_amounts = arrays["loan_amount"]
+        self.term_months = arrays["term_months"]
+        self.annual_rates = arrays["annual_rate"]
+        self.offsets = arrays["offsets"]
+        self.columns = {col: arrays[col] for col in COLUMNS}
+
+    def __len__(self):
+        return len(self.loan_amounts)
+
+    def __repr__(self):
+        return f"<ScheduleStore {self.path!r}: {len(self)} loans, {self.row_count} rows>"
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def row_count(self):
+        return int(self.offsets[-1])
+
+    def loan(self, index):
+        """Loan index's (loan_amount, term_months, annual_rate)."""
+        return (float(self.loan_amounts[index]), int(self.term_months[index]),
+                float(self.annual_rates[index]))
+
+    def schedule(self, index):
+        """Loan index's schedule, as views of the mapped file."""
+        if not 0 <= index < len(self):
+            raise IndexError(f"no loan {index} in a store of {len(self)} loans")
+        start, stop = int(self.offsets[index]), int(self.offsets[index + 1])
+        return Schedule({col: column[start:stop] for col, column in self.columns.items()})
+
+    def close(self):
+        # The map is released once no schedule taken from it is still in use
+        self.map = self.columns = None
+        self.loan_amounts = self.term_months = self.annual_rates = self.offsets = None
@@ -0,0 +1,95 @@
+"""
+Named timing spans for telling which stage of a calculation is slow:
+
+    timer = StageTimer()
+    with timer.span("schedule"):
+        schedule = equal_principal_schedule(...)
+    print(timer.report())
+
+A disabled timer hands out one shared do-nothing span, so spans can stay
+in the code permanently at the cost of a method call each.
+"""
+import time
+
+
+class _Span:
+    __slots__ = ("timer", "name", "start")
+
+    def __init__(self, timer, name):
+        self.timer = timer
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.timer.add(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+NULL_SPAN = _NullSpan()
+
+
+class StageTimer:
+    """
+    Accumulates wall-clock time per named stage, in the order the stages
+    first ran. A stage that runs several times (e.g. once per chunk) adds
+    up, and report() shows how many calls it took.
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.stages = {}    # name -> [seconds, calls]
+
+    def span(self, name):
+        """Context manager timing one run of the named stage."""
+        if not self.enabled:
+            return NULL_SPAN
+        return _Span(self, name)
+
+    def add(self, name, seconds):
+        """Records time measured elsewhere, e.g. on a worker thread."""
+        if not self.enabled:
+            return
+        stage = self.stages.get(name)
+        if stage is None:
+            self.stages[name] = [seconds, 1]
+        else:
+            stage[0] += seconds
+            stage[1] += 1
+
+    def reset(self):
+        self.stages.clear()
+
+    def total(self):
+        return sum(seconds for seconds, _ in self.stages.values())
+
+    def report(self):
+        """Multi-line per-stage breakdown with each stage's share of the total."""
+        total = self.total() or 1.0
+        lines = [f"{'Stage':<12}{'ms':>12}{'calls':>8}{'share':>8}"]
+        for name, (seconds, calls) in self.stages.items():
+            lines.append(f"{name:<12}{seconds * 1000:>12.3f}{calls:>8}{seconds / total:>8.1%}")
+        lines.append(f"{'total':<12}{self.total() * 1000:>12.3f}")
+        return "\n".join(lines)
+
+    def summary(self):
+        """One-line breakdown for a status bar."""
+        return "  ".join(
+            f"{name} {seconds * 1000:.1f} ms" for name, (seconds, _) in self.stages.items()
+        )
+
+
+# Default for code that takes an optional timer; its spans do nothing
+NULL_TIMER = StageTimer(enabled=False)